@@ -3,36 +3,62 @@
 from __future__ import annotations
 
 import os
+import asyncio
+import hashlib
 import json
 import re
 import time
 from collections import defaultdict, deque
+from contextlib import asynccontextmanager
 from statistics import mean
-from typing import Any, Awaitable, Callable, Dict, AsyncGenerator, Deque, List
+from typing import Any, Awaitable, Callable, Dict, AsyncGenerator, Deque, List, Tuple
 
 import httpx
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 
-from tools.github_tools import (
+# Load .env before importing tools: several of them read settings at import time.
+load_dotenv()
+
+from tools.admission import AdmissionController, AdmissionMiddleware  # noqa: E402
+from tools.compression import CompressionMiddleware, compression_snapshot  # noqa: E402
+from tools.github_tools import (  # noqa: E402
     clone_repo,
     create_branch,
     commit_file,
     open_pr,
     list_issues,
+    warm_up as warm_up_github,
 )
-from tools.automation_tools import (
+from tools.automation_tools import (  # noqa: E402
     trigger_workflow,
     run_pytest,
     build_docker_image,
     project_scaffold,
 )
-from tools.image_tools import fetch_and_bw
-
-load_dotenv()
+from tools.http_clients import aclose_all, pooled_client  # noqa: E402
+from tools.image_tools import bw_batch, fetch_and_bw, warm_up as warm_up_images  # noqa: E402
+from tools.profiler import profile as run_profile  # noqa: E402
+from tools.schema import ToolSchema, compile_tool_schema  # noqa: E402
+from tools.shared_state import (  # noqa: E402
+    disable_shared_metrics,
+    get_shared_cache,
+    get_shared_metrics,
+    observe_shared,
+    shared_metrics_error,
+)
+from tools.tracing import (  # noqa: E402
+    PHASE_HISTORY,
+    TracingMiddleware,
+    current_trace,
+    record_phase,
+    span,
+    upstream_tracer,
+)
+from tools.warmup import Warmup  # noqa: E402
 
 AUTH_TOKEN = os.getenv("AUTH_TOKEN")
 LUNA_URL = os.getenv("LUNA_URL", "http://localhost:8000")
@@ -41,8 +67,28 @@ PUBLIC_TOOLS = {
     t.strip() for t in os.getenv("PUBLIC_TOOLS", "code_gen,validate").split(",") if t.strip()
 }
 
-app = FastAPI(title="Luna MCP Server", version="0.1.0")
+# Event-loop-lag driven load shedding for public routes
+ADMISSION = AdmissionController.from_env()
+
+
+@asynccontextmanager
+async def _lifespan(_: FastAPI):
+    monitor = asyncio.create_task(ADMISSION.monitor(), name="loop-lag-monitor")
+    warmup = asyncio.create_task(WARMUP.run(), name="warmup")  # gates /readyz
+    try:
+        yield
+    finally:
+        monitor.cancel()
+        warmup.cancel()
+        await aclose_all()
+
+
+app = FastAPI(title="Luna MCP Server", version="0.1.0", lifespan=_lifespan)
 
+# Innermost so shed responses still get CORS and Server-Timing headers
+app.add_middleware(AdmissionMiddleware, controller=ADMISSION)
+# gzip / br / zstd for large results and SSE (per-event flush)
+app.add_middleware(CompressionMiddleware)
 # CORS for public endpoints
 app.add_middleware(
     CORSMiddleware,
@@ -50,7 +96,10 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Per-phase timings (Server-Timing header, /public/metrics, optional export)
+app.add_middleware(TracingMiddleware)
 
 # Static frontend (if present)
 if os.path.isdir("public"):
@@ -58,22 +107,90 @@ if os.path.isdir("public"):
 
 ToolFunc = Callable[..., Awaitable[Any]]
 TOOL_REGISTRY: Dict[str, ToolFunc] = {}
+TOOL_SCHEMAS: Dict[str, ToolSchema] = {}
+_TOOLS_LIST_CACHE: Dict[str, Any] = {}
 LATENCY_HISTORY: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=500))
 
 
 def record_latency(name: str, start: float):
-    LATENCY_HISTORY[name].append((time.perf_counter() - start) * 1000.0)
+    elapsed_ms = (time.perf_counter() - start) * 1000.0
+    LATENCY_HISTORY[name].append(elapsed_ms)
+    observe_shared(f"tool:{name}", elapsed_ms)
+
+
+def _cache_key(kind: str, *parts: str) -> str:
+    digest = hashlib.sha256("\0".join(parts).encode()).hexdigest()
+    return f"{kind}:{digest}"
+
+
+async def _cache_get(key: str) -> Any:
+    """Cached value for `key`, or None. Cache failures (locked/unwritable DB) count as a miss."""
+    try:
+        cache = get_shared_cache()
+        return None if cache is None else await cache.get(key)
+    except Exception:  # noqa: BLE001
+        return None
+
+
+async def _cache_set(key: str, value: Any) -> None:
+    """Best-effort store; a failing cache never fails the tool call."""
+    try:
+        cache = get_shared_cache()
+        if cache is not None:
+            await cache.set(key, value)
+    except Exception:  # noqa: BLE001
+        pass
+
+
+def _tag_trace(method: str) -> None:
+    trace = current_trace()
+    if trace is not None:
+        trace.attrs["tool"] = method
 
 
 def tool(name: str, desc: str):
     def wrap(fn: ToolFunc):
         TOOL_REGISTRY[name] = fn
+        TOOL_SCHEMAS[name] = compile_tool_schema(fn, name, desc)
+        _TOOLS_LIST_CACHE.clear()
         fn.__doc__ = (fn.__doc__ or "") + f"\nMCP Tool: {name}\nDescription: {desc}"
         return fn
 
     return wrap
 
 
+def _param_errors(method: str, params: Any) -> List[str]:
+    if not isinstance(params, dict):
+        return ["params must be an object"]
+    with span("param_check"):
+        return TOOL_SCHEMAS[method].errors(params)
+
+
+def _tools_list_document() -> Tuple[bytes, str]:
+    """Serialized MCP `tools/list` result and its ETag (rebuilt only when tools change).
+
+    The ETag is weak: the compression middleware may serve the same document
+    gzip/br/zstd encoded, and a strong validator must differ per encoding.
+    """
+    if not _TOOLS_LIST_CACHE:
+        doc = json.dumps(
+            {"tools": [s.describe() for s in TOOL_SCHEMAS.values()]}, separators=(",", ":")
+        ).encode()
+        _TOOLS_LIST_CACHE["body"] = doc
+        _TOOLS_LIST_CACHE["etag"] = f'W/"{hashlib.sha256(doc).hexdigest()[:32]}"'
+    return _TOOLS_LIST_CACHE["body"], _TOOLS_LIST_CACHE["etag"]
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """`If-None-Match` check with weak comparison (RFC 9110 13.1.2): lists, `*` and `W/`."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
 def _verify(req: Request):
     if not AUTH_TOKEN:
         raise HTTPException(status_code=500, detail="Server not configured with AUTH_TOKEN")
@@ -81,20 +198,43 @@ def _verify(req: Request):
         raise HTTPException(status_code=401, detail="invalid token")
 
 
+@app.get("/mcp/tools")
+async def mcp_tools(request: Request):
+    """Cacheable `tools/list` result: `If-None-Match` with the current ETag gives 304."""
+    with span("auth"):
+        _verify(request)
+    doc, etag = _tools_list_document()
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(doc, media_type="application/json", headers=headers)
+
+
 @app.post("/mcp")
 async def mcp_endpoint(body: Dict[str, Any], request: Request):
-    _verify(request)
+    with span("auth"):
+        _verify(request)
     method = body.get("method")
     params = body.get("params") or {}
+    if method == "tools/list":
+        # Always a full JSON-RPC envelope; the ETag is a version marker only
+        # (conditional fetches go through GET /mcp/tools)
+        doc, etag = _tools_list_document()
+        request_id = json.dumps(body.get("id")).encode()
+        envelope = b'{"jsonrpc":"2.0","id":' + request_id + b',"result":' + doc + b"}"
+        return Response(envelope, media_type="application/json", headers={"ETag": etag})
     if method not in TOOL_REGISTRY:
         raise HTTPException(status_code=404, detail="tool_not_found")
     fn = TOOL_REGISTRY[method]
+    _tag_trace(method)
+    errors = _param_errors(method, params)
+    if errors:
+        raise HTTPException(status_code=400, detail=f"Parameter error: {'; '.join(errors)}")
     try:
         t0 = time.perf_counter()
-        result = await fn(**params)
+        with span("tool"):
+            result = await fn(**params)
         record_latency(method, t0)
-    except TypeError as te:
-        raise HTTPException(status_code=400, detail=f"Parameter error: {te}")
     except HTTPException:
         raise
     except Exception as e:  # noqa: BLE001
@@ -153,7 +293,11 @@ async def public_describe(tool_name: str):
     if not fn:
         raise HTTPException(status_code=404, detail="tool_not_found")
     doc = (fn.__doc__ or "").strip().split("MCP Tool:")[0].strip() or "No description available."
-    return {"tool": tool_name, "description": doc}
+    return {
+        "tool": tool_name,
+        "description": doc,
+        "input_schema": TOOL_SCHEMAS[tool_name].input_schema,
+    }
 
 
 @app.post("/public/execute")
@@ -165,16 +309,21 @@ async def public_execute(body: Dict[str, Any]):
     fn = TOOL_REGISTRY.get(method)
     if not fn:
         raise HTTPException(status_code=404, detail="tool_not_found")
+    _tag_trace(method)
+    errors = _param_errors(method, params)
+    if errors:
+        raise HTTPException(status_code=400, detail=f"parameter_error: {'; '.join(errors)}")
     try:
         t0 = time.perf_counter()
-        result = await fn(**params)
+        with span("tool"):
+            result = await fn(**params)
         record_latency(method, t0)
-    except TypeError as te:  # parameter mismatch
-        raise HTTPException(status_code=400, detail=f"parameter_error: {te}") from te
     except Exception as e:  # noqa: BLE001
         # Do not leak stack details publicly
         raise HTTPException(status_code=500, detail="tool_execution_failed") from e
-    return {"method": method, "result": _sanitize(result)}
+    with span("serialize"):
+        sanitized = _sanitize(result)
+    return {"method": method, "result": sanitized}
 
 
 @app.get("/public/stream")
@@ -191,6 +340,8 @@ async def public_stream(method: str, params: str | None = None, prompt: str | No
       returns a dict / list, it will be JSON serialized and chunked. This is a
       *simulated* streaming for demo purposes (tool itself is not inherently
       streaming yet) but provides a stable SSE contract for UI integration.
+      Tools whose stream yields structured items (e.g. img_bw_batch) send one
+      `{"item": ...}` event per item instead and are not re-chunked.
     """
     if method not in PUBLIC_TOOLS:
         raise HTTPException(status_code=403, detail="method_not_public")
@@ -198,52 +349,67 @@ async def public_stream(method: str, params: str | None = None, prompt: str | No
     if not fn:
         raise HTTPException(status_code=404, detail="tool_not_found")
 
+    _tag_trace(method)
+
     # Parse params JSON if provided
     param_dict: Dict[str, Any] = {}
     if params:
         try:
-            param_dict = json.loads(params)
+            with span("params"):
+                param_dict = json.loads(params)
             if not isinstance(param_dict, dict):
                 raise ValueError("params must be an object")
         except Exception as e:  # noqa: BLE001
             raise HTTPException(status_code=400, detail=f"invalid_params: {e}") from e
     if prompt and "prompt" not in param_dict:
         param_dict["prompt"] = prompt
+    errors = _param_errors(method, param_dict)
+    if errors:
+        raise HTTPException(status_code=400, detail=f"parameter_error: {'; '.join(errors)}")
 
     async def generate() -> AsyncGenerator[bytes, None]:
         # Start event
         yield b"event: start\n" + f"data: {{\"method\": \"{method}\"}}\n\n".encode()
+        trace = current_trace()
         try:
             t0 = time.perf_counter()
             # If the tool is streaming capable (exposes _stream attr), iterate
             stream_attr = getattr(fn, "_stream", None)
             if callable(stream_attr):
                 acc = []
+                items = 0
                 stream_iter = stream_attr(**param_dict)
                 try:
                     async for token in stream_iter:  # type: ignore[assignment]
-                        acc.append(token)
-                        payload = json.dumps({"chunk": token})
+                        if isinstance(token, str):
+                            acc.append(token)
+                            payload = json.dumps({"chunk": token})
+                        else:
+                            # Structured item: already complete, sent exactly once
+                            items += 1
+                            payload = json.dumps({"item": _sanitize(token)})
                         yield b"data: " + payload.encode() + b"\n\n"
                 except TypeError:
                     # Not actually async iterable, fallback to direct call
                     acc.append(await fn(**param_dict))
-                result = "".join(str(x) for x in acc)
+                result = None if items and not acc else "".join(str(x) for x in acc)
             else:
                 result = await fn(**param_dict)
             record_latency(method, t0)
-        except TypeError as te:
-            yield b"event: error\n" + f"data: {{\"error\": \"parameter_error: {str(te).replace('\\', '')}\"}}\n\n".encode()
-            return
+            record_phase("tool", t0)
         except Exception as e:  # noqa: BLE001
-            yield b"event: error\n" + f"data: {{\"error\": \"execution_failed\", \"detail\": \"{str(e).replace('\\', '')[:200]}\"}}\n\n".encode()
+            err = json.dumps({"error": "execution_failed", "detail": str(e)[:200]})
+            yield b"event: error\n" + b"data: " + err.encode() + b"\n\n"
             return
 
         # Normalize to string for chunking
-        if isinstance(result, (dict, list)):
-            text = json.dumps(_sanitize(result), indent=2)
-        else:
-            text = str(result)
+        with span("serialize"):
+            if result is None:
+                text = ""  # everything went out as items
+            elif isinstance(result, (dict, list)):
+                text = json.dumps(_sanitize(result), indent=2)
+            else:
+                text = str(result)
 
         # Chunk the text (approx 120 chars per fragment)
         chunk_size = 120
@@ -251,8 +417,12 @@ async def public_stream(method: str, params: str | None = None, prompt: str | No
             frag = text[i : i + chunk_size]
             payload = json.dumps({"chunk": frag, "offset": i})
             yield b"data: " + payload.encode() + b"\n\n"
-        # End event
-        yield b"event: end\n" + b"data: {\"ok\": true}\n\n"
+        # End event; Server-Timing headers went out before the body, so the
+        # phase breakdown of the stream itself travels here instead.
+        end: Dict[str, Any] = {"ok": True}
+        if trace is not None:
+            end["timing"] = {k: round(v, 2) for k, v in trace.totals().items()}
+        yield b"event: end\n" + b"data: " + json.dumps(end).encode() + b"\n\n"
 
     headers = {
         "Cache-Control": "no-cache",
@@ -261,22 +431,90 @@ async def public_stream(method: str, params: str | None = None, prompt: str | No
     return StreamingResponse(generate(), media_type="text/event-stream", headers=headers)
 
 
-@app.get("/public/metrics")
-async def public_metrics():
-    """Return aggregate latency metrics per tool (avg, p95, count)."""
+def _summarize(history: Dict[str, Deque[float]]) -> Dict[str, Dict[str, float | int]]:
     out: Dict[str, Dict[str, float | int]] = {}
-    for tool, hist in LATENCY_HISTORY.items():
+    for name, hist in history.items():
         if not hist:
             continue
         arr: List[float] = list(hist)
         arr_sorted = sorted(arr)
         p95 = arr_sorted[min(len(arr_sorted) - 1, int(0.95 * len(arr_sorted)))]
-        out[tool] = {
+        out[name] = {
             "count": len(arr),
             "avg_ms": round(mean(arr), 2),
             "p95_ms": round(p95, 2),
         }
-    return {"ok": True, "metrics": out}
+    return out
+
+
+@app.get("/public/metrics")
+async def public_metrics():
+    """Return aggregate latency metrics per tool and per request phase (avg, p95, count).
+
+    With `SHARED_STATE_DIR` set the numbers cover every worker on the host
+    (`scope: host`), cumulative since the metrics file was created; otherwise
+    only the worker that answered, over its last 500 samples per name
+    (`scope: worker`). `window` states which one applies.
+    """
+    shared = get_shared_metrics()
+    snap: Dict[str, Dict[str, float | int]] = {}
+    if shared is not None:
+        try:
+            snap, workers = shared.snapshot(), shared.active_workers()
+        except Exception as e:  # noqa: BLE001
+            disable_shared_metrics(e)
+            shared = None
+    if shared is None:
+        return {
+            "ok": True,
+            "scope": "worker",
+            "window": "last_500_samples",
+            "shared_metrics_error": shared_metrics_error(),
+            "metrics": _summarize(LATENCY_HISTORY),
+            "phases": _summarize(PHASE_HISTORY),
+            "admission": ADMISSION.snapshot(),
+            "compression": compression_snapshot(),
+            "warmup": WARMUP.snapshot(),
+        }
+    return {
+        "ok": True,
+        "scope": "host",
+        "window": "cumulative",
+        "workers": workers,
+        "metrics": {k[5:]: v for k, v in snap.items() if k.startswith("tool:")},
+        "phases": {k[6:]: v for k, v in snap.items() if k.startswith("phase:")},
+        "admission": ADMISSION.snapshot(),  # per worker: lag is a property of its loop
+        "compression": compression_snapshot(),
+        "warmup": WARMUP.snapshot(),
+    }
+
+
+# -------------------- Admin endpoints (bearer auth) -------------------- #
+_PROFILE_LOCK = asyncio.Lock()
+
+
+@app.get("/admin/profile")
+async def admin_profile(
+    request: Request,
+    seconds: float = 5.0,
+    interval_ms: float = 10.0,
+    all_threads: bool = False,
+    format: str = "json",
+):
+    """Sample this worker's stacks for `seconds` and report hot paths.
+
+    `format=collapsed` returns plain collapsed stacks (flamegraph.pl /
+    speedscope input); the default JSON also carries event-loop lag and an
+    asyncio task snapshot. One profile per worker at a time.
+    """
+    _verify(request)
+    if _PROFILE_LOCK.locked():
+        raise HTTPException(status_code=409, detail="profile_in_progress")
+    async with _PROFILE_LOCK:
+        report = await run_profile(seconds, interval_ms, all_threads)
+    if format == "collapsed":
+        return PlainTextResponse(report["collapsed"])
+    return {"ok": True, "pid": os.getpid(), **report}
 
 
 @app.get("/")
@@ -292,17 +530,32 @@ async def healthz():
     return {"ok": True, "tool_count": len(TOOL_REGISTRY), "tools": sorted(TOOL_REGISTRY.keys())}
 
 
+@app.get("/readyz")
+async def readyz():
+    """Readiness (as opposed to liveness at `/healthz`).
+
+    503 until the startup warm-up has finished or timed out, so load balancers
+    only route traffic to warmed workers.
+    """
+    snap = WARMUP.snapshot()
+    if not WARMUP.ready:
+        return JSONResponse(snap, status_code=503)
+    return snap
+
+
 async def _post_luna(path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
     url = f"{LUNA_URL}{path}"
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        try:
-            r = await client.post(url, json=payload)
-        except httpx.RequestError as e:
-            raise HTTPException(status_code=502, detail=f"Upstream unreachable: {e}") from e
+    client = pooled_client("luna", timeout=30.0)
+    try:
+        # no outer span: the tracer splits the call into non-overlapping upstream_* phases
+        r = await client.post(url, json=payload, extensions={"trace": upstream_tracer()})
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=502, detail=f"Upstream unreachable: {e}") from e
     if r.status_code >= 400:
         raise HTTPException(status_code=502, detail=f"Upstream {r.status_code}: {r.text[:400]}")
     try:
-        return r.json()
+        with span("upstream_decode"):
+            return r.json()
     except Exception as e:  # noqa: BLE001
         raise HTTPException(status_code=502, detail="Invalid JSON from upstream") from e
 
@@ -333,19 +586,30 @@ async def code_gen(prompt: str) -> Dict[str, Any]:
     Normal response shape:
       {"code": "...", "language": "python|rust|javascript|..."}
     Fallback always returns deterministic Rust snippet.
+    Upstream results are shared between workers through the result cache (if enabled).
     """
+    key = _cache_key("code_gen", prompt)
+    if (hit := await _cache_get(key)) is not None:
+        return hit
+    from_upstream = False
     try:
         data = await _post_luna("/api/ai/code", {"prompt": prompt})
         code = data.get("code") if isinstance(data, dict) else None
         if not code:
             code = str(data)
+        from_upstream = True
     except Exception:  # noqa: BLE001
         code = (
             "// Fallback (generation unavailable)\n"
             f"// Prompt: {prompt}\n"
             "fn main() { println!(\"Hello, world!\"); }"
         )
-    return {"code": code, "language": _detect_lang(code)}
+    with span("lang_detect"):
+        language = _detect_lang(code)
+    result = {"code": code, "language": language}
+    if from_upstream:
+        await _cache_set(key, result)
+    return result
 
 
 class _CodeGenStreamer:
@@ -385,8 +649,14 @@ async def voice_speak(text: str, voice: str | None = None) -> Dict[str, Any]:
 
 @tool("bw_remote", "Remote grayscale transform through Luna Services")
 async def bw_remote(image_url: str) -> str:
+    key = _cache_key("bw_remote", image_url)
+    if (hit := await _cache_get(key)) is not None:
+        return hit
     data = await _post_luna("/api/image/bw", {"image_url": image_url})
-    return data.get("image_b64", "")
+    image_b64 = data.get("image_b64", "")
+    if image_b64:
+        await _cache_set(key, image_b64)
+    return image_b64
 
 
 @tool("git_clone", "Shallow clone a public GitHub repository")
@@ -442,9 +712,18 @@ async def ci_trigger(
     return await trigger_workflow(owner, repo, workflow_file, ref, inputs)
 
 
-@tool("run_tests", "Run pytest (if installed) and return summary")
-async def run_tests() -> Dict[str, Any]:
-    return await run_pytest()
+@tool(
+    "run_tests",
+    "Run pytest sharded across cores (optional target path, result cache, changed-since ref)",
+)
+async def run_tests(
+    path: str = ".",
+    workers: int | None = None,
+    skip_unchanged: bool = False,
+    changed_since: str | None = None,
+) -> Dict[str, Any]:
+    """`path` may be a checkout returned by `git_clone`."""
+    return await run_pytest(path, workers, skip_unchanged, changed_since)
 
 
 @tool("build_image", "Build a Docker image from current directory")
@@ -459,7 +738,32 @@ async def scaffold_project(name: str, with_tests: bool = True) -> Dict[str, Any]
 
 @tool("img_bw", "Fetch image & convert to grayscale (base64 PNG)")
 async def img_bw(image_url: str) -> str:
-    return await fetch_and_bw(image_url)
+    key = _cache_key("img_bw", image_url)
+    if (hit := await _cache_get(key)) is not None:
+        return hit
+    image_b64 = await fetch_and_bw(image_url)
+    await _cache_set(key, image_b64)
+    return image_b64
+
+
+@tool("img_bw_batch", "Fetch & grayscale many images concurrently (per-item results, stream aware)")
+async def img_bw_batch(image_urls: List[str]) -> Dict[str, Any]:
+    """Return per-item results ordered by input index.
+
+    Each item: {"index", "url", "ok", "image_b64"} or {"index", "url", "ok": false, "error"}.
+    """
+    results = [item async for item in bw_batch(image_urls)]
+    results.sort(key=lambda item: item["index"])
+    ok = sum(1 for item in results if item["ok"])
+    return {"results": results, "ok": ok, "failed": len(results) - ok}
+
+
+def img_bw_batch_stream_factory(**kwargs):  # type: ignore[override]
+    # Items are yielded in completion order as soon as each one is ready
+    return bw_batch(kwargs.get("image_urls") or [])
+
+
+setattr(img_bw_batch, "_stream", img_bw_batch_stream_factory)
 
 
 @tool("validate", "Return a fixed validation number in {country_code}{number} format")
@@ -473,6 +777,39 @@ async def validate() -> dict:
     return {"number": "919805763104"}
 
 
+# -------------------- Startup warm-up -------------------- #
+async def _warm_luna() -> None:
+    # Any HTTP answer means DNS + TCP (+ TLS) are done and pooled
+    await pooled_client("luna", timeout=30.0).head(LUNA_URL)
+
+
+async def _warm_github() -> None:
+    # httpx pool (workflow dispatch) and the PyGithub client; /rate_limit is not rate limited
+    await pooled_client("github", timeout=30).get("https://api.github.com/rate_limit")
+    await warm_up_github()
+
+
+async def _warm_local() -> None:
+    _detect_lang("fn main() {}")
+    _tools_list_document()
+
+
+_WARMUP_STEPS: Dict[str, Callable[[], Awaitable[Any]]] = {
+    "luna": _warm_luna,
+    "github": _warm_github,
+    "pillow": warm_up_images,
+    "transform_pool": lambda: warm_up_images(transform_pool=True),
+    "local": _warm_local,
+}
+_WARMUP_ENABLED = [
+    s.strip() for s in os.getenv("WARMUP_STEPS", "luna,github,pillow,local").split(",")
+]
+WARMUP = Warmup(
+    {name: _WARMUP_STEPS[name] for name in _WARMUP_ENABLED if name in _WARMUP_STEPS},
+    timeout=float(os.getenv("WARMUP_TIMEOUT_SECONDS", "10")),
+)
+
+
 # -------------------- Optional OAuth placeholder endpoints -------------------- #
 @app.get("/.well-known/oauth-authorization-server")
 async def oauth_metadata():
@@ -0,0 +1,88 @@
+from collections import OrderedDict
+
+from fastapi.testclient import TestClient
+from mcp_bearer_token import app, loaded_module
+from tools import admission
+from tools.admission import AdmissionController, _client_id, parse_trusted_proxies
+
+
+def test_lag_halves_public_limit_and_recovers():
+    ctl = AdmissionController(capacity=40, auth_reserve=0.25, lag_target_ms=50)
+    assert ctl.public_limit == 30
+    for _ in range(5):
+        ctl.observe_lag(500.0)
+    assert ctl.public_limit < 5
+    for _ in range(200):
+        ctl.observe_lag(0.0)
+    assert ctl.public_limit == 30
+
+
+def test_public_shed_respects_auth_reserve():
+    ctl = AdmissionController(capacity=8, auth_reserve=0.25, client_burst=100)
+    ctl.inflight["public"] = 6  # public ceiling reached
+    assert ctl.admit_public("a") == (503, 1.0)
+    ctl.inflight["public"], ctl.inflight["auth"] = 0, 8  # auth traffic uses everything
+    assert ctl.admit_public("a") == (503, 1.0)
+    assert ctl.shed["overloaded"] == 2
+    assert "a" not in ctl._buckets  # shed requests are not charged a token
+
+
+def test_client_token_bucket_returns_429(monkeypatch):
+    ctl = loaded_module.ADMISSION  # instance wired into the middleware
+    monkeypatch.setattr(ctl, "client_rate", 0.5)
+    monkeypatch.setattr(ctl, "client_burst", 1.0)
+    monkeypatch.setattr(ctl, "_buckets", OrderedDict())
+    client = TestClient(app)
+    body = {"method": "validate"}
+    headers = {"X-Forwarded-For": "203.0.113.7"}
+    assert client.post("/public/execute", json=body, headers=headers).status_code == 200
+    # A fresh forwarded address from an untrusted peer does not buy a new bucket
+    headers = {"X-Forwarded-For": "198.51.100.9"}
+    r = client.post("/public/execute", json=body, headers=headers)
+    assert r.status_code == 429
+    assert int(r.headers["retry-after"]) >= 1
+    # Authenticated traffic is never shed by the public bucket
+    monkeypatch.setattr(loaded_module, "AUTH_TOKEN", "t0k")
+    r = client.post("/mcp", json=body, headers={**headers, "Authorization": "Bearer t0k"})
+    assert r.status_code == 200
+    assert "admission" in client.get("/public/metrics").json()
+
+
+def test_forwarded_for_only_trusted_from_proxies():
+    trusted = parse_trusted_proxies("10.0.0.0/8, 192.0.2.1")
+
+    def scope(peer, xff=None):
+        headers = [(b"x-forwarded-for", xff.encode())] if xff else []
+        return {"client": (peer, 1234), "headers": headers}
+
+    assert _client_id(scope("203.0.113.5", "1.2.3.4"), trusted) == "203.0.113.5"
+    assert _client_id(scope("10.1.2.3", "1.2.3.4"), trusted) == "1.2.3.4"
+    # spoofed left-most hops are ignored: the nearest untrusted hop wins
+    assert _client_id(scope("10.1.2.3", "6.6.6.6, 1.2.3.4, 192.0.2.1"), trusted) == "1.2.3.4"
+    assert _client_id(scope("10.1.2.3"), trusted) == "10.1.2.3"
+    assert _client_id(scope("10.1.2.3", "1.2.3.4"), ()) == "10.1.2.3"
+
+
+def test_bucket_table_is_bounded_lru(monkeypatch):
+    monkeypatch.setattr(admission, "MAX_TRACKED_CLIENTS", 3)
+    ctl = AdmissionController(client_burst=5)
+    for c in ("a", "b", "c"):
+        ctl.admit_public(c)
+    ctl.admit_public("a")  # refreshes a
+    ctl.admit_public("d")  # evicts b, the least recently seen
+    assert list(ctl._buckets) == ["c", "a", "d"]
+
+
+def test_warns_once_for_private_peer_without_trusted_proxies(caplog):
+    async def ok(scope, receive, send):
+        pass
+
+    mw = admission.AdmissionMiddleware(ok, AdmissionController(), trusted_proxies=())
+    scope = {"client": ("10.0.0.5", 1234)}
+    with caplog.at_level("WARNING", logger="tools.admission"):
+        mw._check_proxy_config(scope)
+        mw._check_proxy_config(scope)
+    assert len([r for r in caplog.records if "TRUSTED_PROXIES" in r.message]) == 1
+    mw._warned_untrusted_proxy = False
+    mw._check_proxy_config({"client": ("8.8.8.8", 1234)})  # public peer: direct client
+    assert not mw._warned_untrusted_proxy
@@ -0,0 +1,77 @@
+import asyncio
+import zlib
+
+from fastapi.testclient import TestClient
+from mcp_bearer_token import app, loaded_module
+from starlette.responses import JSONResponse
+from tools import compression
+from tools.compression import CompressionMiddleware, _Gzip, available_encoders, negotiate
+
+AUTH = {"Authorization": "Bearer t0k"}
+
+
+def test_negotiate_respects_q_values_and_preference():
+    encoders = {"zstd": object, "br": object, "gzip": object}
+    assert negotiate("gzip, br", encoders) == "br"
+    assert negotiate("gzip;q=1, zstd;q=0.5", encoders) == "gzip"
+    assert negotiate("identity", encoders) is None
+    assert negotiate("*;q=0", available_encoders()) is None
+
+
+def test_large_json_compressed_small_left_alone(monkeypatch):
+    monkeypatch.setattr(loaded_module, "AUTH_TOKEN", "t0k")
+    client = TestClient(app)
+    big = client.post(
+        "/mcp", json={"method": "tools/list"}, headers={**AUTH, "Accept-Encoding": "gzip"}
+    )
+    assert big.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in big.headers["vary"].lower()
+    assert big.json()["result"]["tools"]  # transparently decoded
+
+    small = client.get("/public/tools", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert client.get("/public/metrics").json()["compression"]["gzip"]["bytes_out"] > 0
+
+
+def test_sse_stream_compressed():
+    r = TestClient(app).get(
+        "/public/stream",
+        params={"method": "validate"},
+        headers={"Accept-Encoding": "gzip"},
+    )
+    assert r.headers["content-encoding"] == "gzip"
+    assert "event: end" in r.text
+
+
+def test_streaming_encoder_flushes_each_event():
+    enc = _Gzip()
+    dec = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for i in range(3):
+        event = f'data: {{"chunk": "part {i}"}}\n\n'.encode()
+        # every flushed frame decodes to the complete event without more input
+        assert dec.decompress(enc.compress(event)) == event
+    assert dec.decompress(enc.finish()) == b""
+
+
+def test_large_bodies_compressed_off_the_event_loop(monkeypatch):
+    offloaded = []
+    real_to_thread = asyncio.to_thread
+
+    async def spy(fn, *args):
+        offloaded.append(len(args[1]))
+        return await real_to_thread(fn, *args)
+
+    monkeypatch.setattr(compression.asyncio, "to_thread", spy)
+    payload = {"image_b64": "A" * 300_000}
+    wrapped = CompressionMiddleware(
+        JSONResponse(payload), prefixes=("/",), thread_min_size=256 * 1024
+    )
+    r = TestClient(wrapped).get("/", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.json() == payload
+    assert offloaded and offloaded[0] >= 300_000
+
+    offloaded.clear()
+    small = CompressionMiddleware(JSONResponse({"a": "b" * 2000}), prefixes=("/",))
+    assert TestClient(small).get("/", headers={"Accept-Encoding": "gzip"}).status_code == 200
+    assert not offloaded  # below the cutoff stays inline
@@ -0,0 +1,88 @@
+import base64
+import io
+import json
+
+import httpx
+import pytest
+from PIL import Image
+from tools.image_tools import bw_batch
+
+
+def _png(color) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_bw_batch_isolates_failures():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.startswith("/missing"):
+            return httpx.Response(404)
+        if request.url.path.startswith("/garbage"):
+            return httpx.Response(200, content=b"not an image")
+        return httpx.Response(200, content=_png((255, 0, 0)))
+
+    urls = [f"http://img.test/ok/{i}" for i in range(6)]
+    urls += ["http://img.test/missing/1", "http://img.test/garbage/1"]
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        items = [item async for item in bw_batch(urls, fetch_concurrency=3, client=client)]
+
+    assert sorted(item["index"] for item in items) == list(range(len(urls)))
+    by_index = {item["index"]: item for item in items}
+    for i in range(6):
+        assert by_index[i]["ok"]
+        with Image.open(io.BytesIO(base64.b64decode(by_index[i]["image_b64"]))) as img:
+            assert img.mode == "L"
+    assert not by_index[6]["ok"] and "404" in by_index[6]["error"]
+    assert not by_index[7]["ok"]
+
+
+@pytest.mark.asyncio
+async def test_bw_batch_rejects_oversized_batch():
+    with pytest.raises(ValueError):
+        async for _ in bw_batch(["http://img.test/x"] * 1000):
+            pass
+
+
+def test_public_stream_sends_each_batch_item_once(monkeypatch):
+    from fastapi.testclient import TestClient
+    from mcp_bearer_token import app, loaded_module
+
+    async def fake_batch(urls):
+        for i, url in enumerate(urls):
+            yield {"index": i, "url": url, "ok": True, "image_b64": "QUJD" * 100}
+
+    monkeypatch.setattr(loaded_module, "PUBLIC_TOOLS", {"img_bw_batch"})
+    monkeypatch.setattr(loaded_module, "bw_batch", fake_batch)
+    params = '{"image_urls": ["http://img.test/a", "http://img.test/b"]}'
+    r = TestClient(app).get("/public/stream", params={"method": "img_bw_batch", "params": params})
+    assert r.status_code == 200
+
+    data = [line[6:] for line in r.text.splitlines() if line.startswith("data: ")]
+    events = [json.loads(d) for d in data]  # every event is valid JSON
+    items = [e["item"] for e in events if "item" in e]
+    assert [item["index"] for item in items] == [0, 1]
+    assert not any("chunk" in e for e in events)  # no re-chunked repr of the batch
+    assert r.text.count("QUJD" * 100) == 2
+
+
+def test_broken_pool_replaced_only_once(monkeypatch):
+    from tools import image_tools
+
+    class FakePool:
+        def __init__(self):
+            self.shutdowns = 0
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.shutdowns += 1
+
+    broken, replacement = FakePool(), FakePool()
+    monkeypatch.setattr(image_tools, "_pool", broken)
+    image_tools._replace_broken_pool(broken)
+    assert image_tools._pool is None and broken.shutdowns == 1
+
+    # A late failure from the old pool must not drop the new one
+    monkeypatch.setattr(image_tools, "_pool", replacement)
+    image_tools._replace_broken_pool(broken)
+    assert image_tools._pool is replacement and replacement.shutdowns == 0
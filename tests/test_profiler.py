@@ -0,0 +1,28 @@
+from fastapi.testclient import TestClient
+from mcp_bearer_token import app, loaded_module
+
+
+def test_profile_requires_auth(monkeypatch):
+    monkeypatch.setattr(loaded_module, "AUTH_TOKEN", "t0k")
+    r = TestClient(app).get("/admin/profile", params={"seconds": 0.1})
+    assert r.status_code == 401
+
+
+def test_profile_reports_stacks_lag_and_tasks(monkeypatch):
+    monkeypatch.setattr(loaded_module, "AUTH_TOKEN", "t0k")
+    client = TestClient(app)
+    auth = {"Authorization": "Bearer t0k"}
+    r = client.get("/admin/profile", params={"seconds": 0.3, "interval_ms": 5}, headers=auth)
+    assert r.status_code == 200
+    data = r.json()
+    assert data["samples"] > 0
+    assert data["collapsed"]
+    assert data["loop_lag"]["probes"] > 0
+    assert any(t["state"] == "pending" for t in data["tasks"])
+
+    r = client.get(
+        "/admin/profile", params={"seconds": 0.1, "format": "collapsed"}, headers=auth
+    )
+    assert r.headers["content-type"].startswith("text/plain")
+    stack, _, count = r.text.splitlines()[0].rpartition(" ")
+    assert ";" in stack and int(count) > 0
@@ -0,0 +1,86 @@
+import os
+import subprocess
+from pathlib import Path
+
+import pytest
+from tools.automation_tools import run_pytest
+
+
+def _project(root: Path) -> None:
+    (root / "pkg").mkdir()
+    (root / "pkg" / "__init__.py").write_text("")
+    (root / "pkg" / "calc.py").write_text("def add(a, b):\n    return a + b\n")
+    (root / "tests").mkdir()
+    (root / "tests" / "test_calc.py").write_text(
+        "from pkg.calc import add\n\ndef test_add():\n    assert add(1, 2) == 3\n"
+    )
+    (root / "tests" / "test_plain.py").write_text("def test_ok():\n    assert True\n")
+    (root / "tests" / "test_broken.py").write_text("def test_bad():\n    assert 1 == 2\n")
+
+
+@pytest.mark.asyncio
+async def test_sharded_run_merges_and_caches(tmp_path):
+    _project(tmp_path)
+    first = await run_pytest(str(tmp_path), workers=2)
+    assert first["shards"] == min(2, os.cpu_count() or 1)
+    assert first["exit_code"] == 1
+    assert first["files"]["tests/test_calc.py"]["passed"] == 1
+    assert first["summary"][1] == "tests/test_broken.py::test_bad"
+
+    second = await run_pytest(str(tmp_path), workers=2, skip_unchanged=True)
+    assert sorted(second["cached"]) == ["tests/test_calc.py", "tests/test_plain.py"]
+
+    # Changing an imported module invalidates only the tests that depend on it
+    (tmp_path / "pkg" / "calc.py").write_text("def add(a, b):\n    return b + a\n")
+    third = await run_pytest(str(tmp_path), skip_unchanged=True)
+    assert third["cached"] == ["tests/test_plain.py"]
+
+
+@pytest.mark.asyncio
+async def test_changed_since_selects_dependents(tmp_path):
+    _project(tmp_path)
+    git = ["git", "-c", "user.email=t@example.com", "-c", "user.name=t"]
+    subprocess.run(git + ["init", "-q"], cwd=tmp_path, check=True)
+    subprocess.run(git + ["add", "."], cwd=tmp_path, check=True)
+    subprocess.run(git + ["commit", "-qm", "init"], cwd=tmp_path, check=True)
+
+    (tmp_path / "pkg" / "calc.py").write_text("def add(a, b):\n    return b + a\n")
+    out = await run_pytest(str(tmp_path), changed_since="HEAD")
+    assert out["selected"] == 1
+    assert list(out["files"]) == ["tests/test_calc.py"]
+    assert out["exit_code"] == 0
+
+
+@pytest.mark.asyncio
+async def test_changed_since_rejects_options_and_unknown_refs(tmp_path):
+    _project(tmp_path)
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+    written = tmp_path / "injected.txt"
+    with pytest.raises(ValueError):
+        await run_pytest(str(tmp_path), changed_since=f"--output={written}")
+    with pytest.raises(RuntimeError):
+        await run_pytest(str(tmp_path), changed_since="no-such-ref")
+    assert not written.exists()
+
+
+@pytest.mark.asyncio
+async def test_workers_capped_at_cpu_count(tmp_path):
+    _project(tmp_path)
+    out = await run_pytest(str(tmp_path), workers=10_000)
+    assert out["shards"] == min(3, os.cpu_count() or 1)
+
+
+@pytest.mark.asyncio
+async def test_failures_under_parent_pytest_config_are_not_cached(tmp_path):
+    (tmp_path / "pytest.ini").write_text("[pytest]\n")
+    sub = tmp_path / "sub"
+    sub.mkdir()
+    (sub / "test_bad.py").write_text("def test_bad():\n    assert 0\n")
+
+    first = await run_pytest(str(sub))
+    assert first["exit_code"] == 1
+    assert first["files"]["test_bad.py"]["failed"] == 1
+
+    second = await run_pytest(str(sub), skip_unchanged=True)
+    assert second["cached"] == []
+    assert second["exit_code"] == 1
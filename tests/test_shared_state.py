@@ -0,0 +1,78 @@
+import multiprocessing
+import sqlite3
+
+import pytest
+from tools.shared_state import SharedCache, SharedMetrics
+
+
+def _worker(path: str, n: int) -> None:
+    m = SharedMetrics(path)
+    for _ in range(n):
+        m.observe("tool:code_gen", 10.0)
+
+
+def test_metrics_aggregate_across_processes(tmp_path):
+    path = str(tmp_path / "metrics.mmap")
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_worker, args=(path, 50)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=30)
+        assert p.exitcode == 0
+
+    local = SharedMetrics(path)
+    local.observe("tool:code_gen", 100.0)
+    snap = local.snapshot()["tool:code_gen"]
+    assert snap["count"] == 151
+    assert snap["max_ms"] == 100.0
+    assert snap["avg_ms"] == pytest.approx((150 * 10.0 + 100.0) / 151, abs=0.01)
+    assert local.active_workers() == 1  # spawned workers exited and released their regions
+
+
+@pytest.mark.asyncio
+async def test_cache_roundtrip_and_ttl(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    writer, reader = SharedCache(path), SharedCache(path)
+    await writer.set("code_gen:abc", {"code": "x", "language": "plaintext"})
+    assert await reader.get("code_gen:abc") == {"code": "x", "language": "plaintext"}
+    await writer.set("expired", "v", ttl=-1)
+    assert await reader.get("expired") is None
+
+
+@pytest.mark.asyncio
+async def test_cache_errors_count_as_miss(monkeypatch):
+    from mcp_bearer_token import TOOL_REGISTRY, loaded_module
+
+    class LockedCache:
+        async def get(self, key):
+            raise sqlite3.OperationalError("database is locked")
+
+        async def set(self, key, value, ttl=None):
+            raise sqlite3.OperationalError("database is locked")
+
+    async def upstream(path, payload):
+        return {"code": "print('hi')"}
+
+    monkeypatch.setattr(loaded_module, "get_shared_cache", lambda: LockedCache())
+    monkeypatch.setattr(loaded_module, "_post_luna", upstream)
+    out = await TOOL_REGISTRY["code_gen"](prompt="hi")
+    assert out == {"code": "print('hi')", "language": "plaintext"}
+
+
+def test_unusable_metrics_dir_falls_back_to_worker_metrics(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    from mcp_bearer_token import app
+    from tools import shared_state
+
+    stale = tmp_path / "metrics.mmap"
+    SharedMetrics(str(stale), regions=2, slots=4)  # layout left by an older build
+    for bad_dir in ("/proc/nope", str(tmp_path)):
+        monkeypatch.setattr(shared_state, "SHARED_STATE_DIR", bad_dir)
+        monkeypatch.setattr(shared_state, "_metrics", None)
+        monkeypatch.setattr(shared_state, "_metrics_error", None)
+        client = TestClient(app)
+        assert client.post("/public/execute", json={"method": "validate"}).status_code == 200
+        metrics = client.get("/public/metrics").json()
+        assert metrics["scope"] == "worker" and metrics["window"] == "last_500_samples"
+        assert metrics["shared_metrics_error"]
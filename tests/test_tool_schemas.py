@@ -0,0 +1,68 @@
+from fastapi.testclient import TestClient
+from mcp_bearer_token import app, loaded_module
+
+AUTH = {"Authorization": "Bearer t0k"}
+
+
+def test_schema_compiled_from_signature():
+    schema = loaded_module.TOOL_SCHEMAS["list_issues"].input_schema
+    assert schema["required"] == ["owner", "repo"]
+    assert schema["properties"]["limit"] == {"type": "integer", "default": 20}
+    assert schema["additionalProperties"] is False
+
+
+def test_bad_params_rejected_before_dispatch(monkeypatch):
+    monkeypatch.setattr(loaded_module, "AUTH_TOKEN", "t0k")
+    called = []
+
+    async def fake_list_issues(*args):  # noqa: ANN002
+        called.append(args)
+        return {"issues": []}
+
+    monkeypatch.setattr(loaded_module, "list_issues", fake_list_issues)
+    client = TestClient(app)
+    body = {"method": "list_issues", "params": {"owner": "o", "repo": "r", "limit": "20"}}
+    r = client.post("/mcp", json=body, headers=AUTH)
+    assert r.status_code == 400
+    assert "'limit'" in r.json()["detail"]
+    assert not called
+
+
+def test_type_error_inside_tool_is_not_a_parameter_error(monkeypatch):
+    monkeypatch.setattr(loaded_module, "AUTH_TOKEN", "t0k")
+
+    async def broken():
+        raise TypeError("bug inside the tool")
+
+    monkeypatch.setitem(loaded_module.TOOL_REGISTRY, "validate", broken)
+    r = TestClient(app).post("/mcp", json={"method": "validate"}, headers=AUTH)
+    assert r.status_code == 500
+
+
+def test_tools_list_with_etag(monkeypatch):
+    monkeypatch.setattr(loaded_module, "AUTH_TOKEN", "t0k")
+    client = TestClient(app)
+    r = client.post("/mcp", json={"jsonrpc": "2.0", "id": 7, "method": "tools/list"}, headers=AUTH)
+    assert r.status_code == 200
+    data = r.json()
+    assert data["id"] == 7
+    names = {t["name"] for t in data["result"]["tools"]}
+    assert {"code_gen", "run_tests", "img_bw_batch"} <= names
+    etag = r.headers["etag"]
+    # POST never answers 304: the JSON-RPC envelope always comes back
+    again = client.post(
+        "/mcp",
+        json={"jsonrpc": "2.0", "id": 8, "method": "tools/list"},
+        headers={**AUTH, "If-None-Match": etag},
+    )
+    assert again.status_code == 200 and again.json()["id"] == 8
+
+    cached = client.get("/mcp/tools", headers=AUTH)
+    assert cached.status_code == 200 and cached.headers["etag"] == etag
+    assert cached.json() == data["result"]
+    assert etag.startswith('W/"')  # same validator for identity and compressed bodies
+    for header in (etag, etag[2:], f'"other", {etag}', "*"):
+        r = client.get("/mcp/tools", headers={**AUTH, "If-None-Match": header})
+        assert r.status_code == 304, header
+    assert client.get("/mcp/tools", headers={**AUTH, "If-None-Match": '"other"'}).status_code == 200
+    assert client.get("/mcp/tools").status_code == 401
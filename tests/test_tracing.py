@@ -0,0 +1,36 @@
+import json
+
+from fastapi.testclient import TestClient
+from mcp_bearer_token import app, loaded_module
+from tools import tracing
+
+
+def test_mcp_returns_server_timing(monkeypatch):
+    monkeypatch.setattr(loaded_module, "AUTH_TOKEN", "t0k")
+    client = TestClient(app)
+    r = client.post(
+        "/mcp",
+        json={"jsonrpc": "2.0", "id": 1, "method": "validate"},
+        headers={"Authorization": "Bearer t0k"},
+    )
+    assert r.status_code == 200
+    timing = r.headers["server-timing"]
+    for phase in ("auth;dur=", "tool;dur=", "total;dur="):
+        assert phase in timing
+
+    metrics = client.get("/public/metrics").json()
+    assert {"auth", "tool"} <= set(metrics["phases"])
+
+
+def test_sampled_trace_export(tmp_path, monkeypatch):
+    out = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_EXPORT_PATH", str(out))
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    client = TestClient(app)
+    r = client.post("/public/execute", json={"method": "validate"})
+    assert r.status_code == 200
+
+    record = json.loads(out.read_text().splitlines()[-1])
+    assert record["name"] == "POST /public/execute"
+    assert record["attrs"]["tool"] == "validate"
+    assert {"tool", "serialize"} <= {s["name"] for s in record["spans"]}
@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from mcp_bearer_token import app, loaded_module
+from tools.warmup import Warmup
+
+
+@pytest.mark.asyncio
+async def test_warmup_records_failures_and_times_out():
+    async def ok():
+        pass
+
+    async def broken():
+        raise RuntimeError("dns failure")
+
+    async def hangs():
+        await asyncio.sleep(10)
+
+    w = Warmup({"ok": ok, "broken": broken, "hangs": hangs}, timeout=0.2)
+    assert not w.ready
+    await w.run()
+    assert w.ready and w.state == "timed_out"
+    assert w.results["ok"]["ok"] is True
+    broken_ms = w.results["broken"]["ms"]
+    assert w.results["broken"] == {"ok": False, "error": "dns failure", "ms": broken_ms}
+    assert w.results["hangs"]["error"] == "timed_out"
+    assert w.duration_ms is not None and w.duration_ms < 5000
+
+
+def test_readyz_gated_on_warmup(monkeypatch):
+    async def slow():
+        await asyncio.sleep(0.5)
+
+    monkeypatch.setattr(loaded_module, "WARMUP", Warmup({"slow": slow}, timeout=5))
+    with TestClient(app) as client:
+        assert client.get("/healthz").status_code == 200
+        assert client.get("/readyz").status_code == 503
+        deadline = time.monotonic() + 5
+        while client.get("/readyz").status_code != 200:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        warmup = client.get("/public/metrics").json()["warmup"]
+        assert warmup["state"] == "ready"
+        assert warmup["duration_ms"] >= 500
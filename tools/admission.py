@@ -0,0 +1,249 @@
+"""Adaptive admission control for public routes driven by event-loop lag.
+
+`AdmissionController.monitor()` runs for the app's lifetime, sleep-probing the
+loop and adjusting how many public requests may be in flight (AIMD: halve on
+lag above `lag_target_ms`, +1 per healthy probe). `AdmissionMiddleware`
+applies it:
+
+  - public routes first pass the adaptive in-flight limit, which never
+    reaches into the share of capacity reserved for authenticated `/mcp`
+    traffic (503 + Retry-After)
+  - then a per-client token bucket (429 + Retry-After), so shed requests cost
+    no tokens; the client is the peer address, or the `X-Forwarded-For` hop
+    nearest to us that is not a configured trusted proxy (`TRUSTED_PROXIES`)
+  - `/mcp` is counted but never shed here
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import logging
+import math
+import os
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Any, Deque, Dict, List, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+MAX_TRACKED_CLIENTS = 10_000
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "last")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.last = now
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        capacity: int = 64,
+        auth_reserve: float = 0.25,
+        lag_target_ms: float = 50.0,
+        client_rate: float = 2.0,
+        client_burst: float = 10.0,
+        probe_interval: float = 0.05,
+    ):
+        self.capacity = capacity
+        self.public_ceiling = max(1, int(capacity * (1.0 - auth_reserve)))
+        self.public_limit = float(self.public_ceiling)
+        self.lag_target_ms = lag_target_ms
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.probe_interval = probe_interval
+        self.inflight: Counter[str] = Counter()
+        self.shed: Counter[str] = Counter()
+        self.lag_ms = 0.0  # EWMA of recent probes
+        self.lag_history: Deque[float] = deque(maxlen=600)
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()  # LRU order
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            capacity=int(os.getenv("ADMISSION_CAPACITY", "64")),
+            auth_reserve=float(os.getenv("ADMISSION_AUTH_RESERVE", "0.25")),
+            lag_target_ms=float(os.getenv("LAG_TARGET_MS", "50")),
+            client_rate=float(os.getenv("PUBLIC_RATE_PER_SEC", "2")),
+            client_burst=float(os.getenv("PUBLIC_BURST", "10")),
+        )
+
+    # -------- lag monitor -------- #
+    def observe_lag(self, lag_ms: float) -> None:
+        self.lag_history.append(lag_ms)
+        self.lag_ms = 0.7 * self.lag_ms + 0.3 * lag_ms
+        if self.lag_ms > self.lag_target_ms:
+            self.public_limit = max(1.0, self.public_limit / 2)
+        else:
+            self.public_limit = min(float(self.public_ceiling), self.public_limit + 1)
+
+    async def monitor(self) -> None:
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.probe_interval)
+            self.observe_lag(max(0.0, (time.perf_counter() - t0 - self.probe_interval) * 1000.0))
+
+    # -------- admission -------- #
+    def _take_token(self, client: str) -> float:
+        """Consume one token; return 0 on success or seconds until one is available."""
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_CLIENTS:
+                self._buckets.popitem(last=False)  # least recently seen client
+            bucket = self._buckets[client] = TokenBucket(self.client_burst, now)
+        else:
+            self._buckets.move_to_end(client)
+        refill = (now - bucket.last) * self.client_rate
+        bucket.tokens = min(self.client_burst, bucket.tokens + refill)
+        bucket.last = now
+        if bucket.tokens >= 1.0:
+            bucket.tokens -= 1.0
+            return 0.0
+        return (1.0 - bucket.tokens) / max(self.client_rate, 1e-9)
+
+    def admit_public(self, client: str) -> Tuple[int, float] | None:
+        """Return None to admit, else (status, retry_after_seconds)."""
+        room = min(int(self.public_limit), self.capacity - self.inflight["auth"])
+        if self.inflight["public"] >= room:
+            self.shed["overloaded"] += 1
+            return 503, 1.0
+        wait = self._take_token(client)
+        if wait:
+            self.shed["rate_limited"] += 1
+            return 429, wait
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        arr: List[float] = sorted(self.lag_history)
+
+        def pct(q: float) -> float:
+            return round(arr[min(len(arr) - 1, int(q * len(arr)))], 2) if arr else 0.0
+
+        return {
+            "lag_ms": {
+                "ewma": round(self.lag_ms, 2),
+                "p50": pct(0.50),
+                "p95": pct(0.95),
+                "p99": pct(0.99),
+                "max": round(arr[-1], 2) if arr else 0.0,
+            },
+            "public_limit": int(self.public_limit),
+            "capacity": self.capacity,
+            "inflight": dict(self.inflight),
+            "shed": dict(self.shed),
+        }
+
+
+Network = ipaddress.IPv4Network | ipaddress.IPv6Network
+
+
+def parse_trusted_proxies(value: str) -> Tuple[Network, ...]:
+    """Parse a comma separated list of proxy addresses / CIDR ranges."""
+    return tuple(
+        ipaddress.ip_network(v.strip(), strict=False) for v in value.split(",") if v.strip()
+    )
+
+
+def _is_trusted(addr: str, trusted: Tuple[Network, ...]) -> bool:
+    try:
+        ip = ipaddress.ip_address(addr)
+    except ValueError:
+        return False
+    return any(ip in net for net in trusted)
+
+
+def _client_id(scope: Scope, trusted: Tuple[Network, ...] = ()) -> str:
+    """Peer address; `X-Forwarded-For` is only honoured when the peer is a trusted proxy.
+
+    The list is walked right to left (each proxy appends the address it saw),
+    stopping at the first hop that is not itself trusted: everything to the
+    left of it is client-controlled.
+    """
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if not trusted or not _is_trusted(peer, trusted):
+        return peer
+    hops: List[str] = []
+    for name, value in scope.get("headers", []):
+        if name == b"x-forwarded-for":
+            hops.extend(h.strip() for h in value.decode("latin-1").split(","))
+    for hop in reversed(hops):
+        if hop and not _is_trusted(hop, trusted):
+            return hop
+    return peer
+
+
+class AdmissionMiddleware:
+    """ASGI middleware enforcing `AdmissionController` decisions."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        controller: AdmissionController,
+        public_paths: Tuple[str, ...] = ("/public/execute", "/public/stream"),
+        auth_paths: Tuple[str, ...] = ("/mcp",),
+        trusted_proxies: Tuple[Network, ...] | None = None,
+    ) -> None:
+        self.app = app
+        self.controller = controller
+        self.public_paths = public_paths
+        self.auth_paths = auth_paths
+        if trusted_proxies is None:
+            trusted_proxies = parse_trusted_proxies(os.getenv("TRUSTED_PROXIES", ""))
+        self.trusted_proxies = trusted_proxies
+        self._warned_untrusted_proxy = False
+
+    def _check_proxy_config(self, scope: Scope) -> None:
+        # Behind a load balancer with no TRUSTED_PROXIES every client shares the
+        # balancer's bucket; say so once instead of silently throttling everyone.
+        client = scope.get("client")
+        if self.trusted_proxies or self._warned_untrusted_proxy or not client:
+            return
+        try:
+            peer = ipaddress.ip_address(client[0])
+        except ValueError:
+            return
+        if peer.is_private or peer.is_loopback:
+            self._warned_untrusted_proxy = True
+            log.warning(
+                "public request from private peer %s and TRUSTED_PROXIES is empty: if this is a "
+                "proxy, all clients share one rate-limit bucket; set TRUSTED_PROXIES",
+                peer,
+            )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        if path in self.public_paths:
+            klass = "public"
+            self._check_proxy_config(scope)
+            verdict = self.controller.admit_public(_client_id(scope, self.trusted_proxies))
+            if verdict is not None:
+                status, retry_after = verdict
+                detail = "rate_limited" if status == 429 else "overloaded"
+                response = JSONResponse(
+                    {"detail": detail},
+                    status_code=status,
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+                )
+                await response(scope, receive, send)
+                return
+        elif path in self.auth_paths and scope["method"] == "POST":
+            klass = "auth"
+        else:
+            await self.app(scope, receive, send)
+            return
+        self.controller.inflight[klass] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.inflight[klass] -= 1
@@ -1,40 +1,182 @@
 # moved from subdirectory
 import os
+import sys
+import time
 import asyncio
-from typing import Dict, Any
+import tempfile
+from typing import Dict, Any, List
 
-import httpx
+from tools.http_clients import pooled_client
+from tools.pytest_shards import (
+    DependencyIndex,
+    discover_test_files,
+    load_cache,
+    parse_junit,
+    save_cache,
+    select_changed,
+    shard,
+)
+from tools.tracing import span
 
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN", "")
 
 
 async def _run(cmd: list[str], cwd: str | None = None, timeout: int = 900) -> tuple[int, str]:
-    proc = await asyncio.create_subprocess_exec(
-        *cmd,
-        cwd=cwd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.STDOUT,
-    )
-    try:
-        out, _ = await asyncio.wait_for(proc.communicate(), timeout=timeout)
-    except asyncio.TimeoutError:
-        proc.kill()
-        raise RuntimeError(f"Timeout running: {' '.join(cmd)}")
+    with span("subprocess"):
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            cwd=cwd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        try:
+            out, _ = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            raise RuntimeError(f"Timeout running: {' '.join(cmd)}")
     return proc.returncode, out.decode(errors="replace")
 
 
-async def run_pytest() -> Dict[str, Any]:
-    if not any(os.path.exists(p) for p in ("tests", "test")):
-        return {"skipped": True, "reason": "No tests directory."}
+def _merge_exit_codes(codes: List[int], have_cached: bool) -> int:
+    # pytest: 0 ok, 1 failures, 2+ interrupted/internal/usage, 5 nothing collected
+    bad = [c for c in codes if c not in (0, 5)]
+    if bad:
+        return max(bad)
+    return 0 if 0 in codes or have_cached else 5
+
+
+async def run_pytest(
+    path: str = ".",
+    workers: int | None = None,
+    skip_unchanged: bool = False,
+    changed_since: str | None = None,
+) -> Dict[str, Any]:
+    """Run the test files under `path` sharded across parallel pytest processes.
+
+    - `workers`: number of shards (default and upper bound: CPU count)
+    - `skip_unchanged`: reuse cached passing results of files whose sources are unchanged
+    - `changed_since`: only run files whose sources differ from this git ref
+
+    Discovery, import resolution and hashing run in a worker thread so large
+    target repositories do not stall the event loop. Test files are found by
+    name (`test_*.py` / `*_test.py`) and passed to pytest explicitly, so the
+    target's `testpaths` / `python_files` / `norecursedirs` are not applied.
+    """
+    root = os.path.abspath(path)
+    if not os.path.isdir(root):
+        return {"skipped": True, "reason": f"Not a directory: {path}"}
     try:
         import pytest  # noqa
     except Exception:
         return {"skipped": True, "reason": "pytest not installed (activate dev extras)."}
-    code, output = await _run(["pytest", "-q"])
+    if changed_since is not None and (not changed_since or changed_since.startswith("-")):
+        raise ValueError(f"invalid git ref: {changed_since!r}")
+    tests = await asyncio.to_thread(discover_test_files, root)
+    if not tests:
+        return {"skipped": True, "reason": "No test files found."}
+
+    started = time.perf_counter()
+    index = DependencyIndex(root)
+    if changed_since:
+        # --end-of-options: the ref can never be parsed as a git option
+        verify = ["git", "rev-parse", "--verify", "--quiet", "--end-of-options"]
+        code, out = await _run([*verify, f"{changed_since}^{{commit}}"], cwd=root, timeout=60)
+        if code != 0:
+            raise RuntimeError(f"unknown git ref: {changed_since}")
+        diff_cmd = ["git", "diff", "--relative", "--name-only", "--end-of-options", out.strip()]
+        code, diff = await _run(diff_cmd, cwd=root, timeout=60)
+        if code != 0:
+            raise RuntimeError(f"git diff against {changed_since} failed: {diff[-400:]}")
+        code, untracked = await _run(
+            ["git", "ls-files", "--others", "--exclude-standard"], cwd=root
+        )
+        if code != 0:
+            raise RuntimeError(f"git ls-files failed: {untracked[-400:]}")
+        changed = {os.path.normpath(p) for p in (diff + untracked).splitlines() if p.strip()}
+        tests = await asyncio.to_thread(select_changed, index, tests, changed)
+        if not tests:
+            return {
+                "exit_code": 0,
+                "summary": [f"No test files affected by changes since {changed_since}"],
+                "truncated_output": "",
+                "path": root,
+                "selected": 0,
+            }
+
+    cache = await asyncio.to_thread(load_cache, root)
+    keys = await asyncio.to_thread(lambda: {t: index.cache_key(t) for t in tests})
+    files: Dict[str, Any] = {}
+    cached: List[str] = []
+    if skip_unchanged:
+        for t in tests:
+            entry = cache.get(t)
+            if entry and entry.get("ok") and entry.get("key") == keys[t]:
+                cached.append(t)
+                files[t] = {**entry["result"], "cached": True}
+    to_run = [t for t in tests if t not in files]
+
+    durations = {t: cache.get(t, {}).get("duration", 1.0) for t in to_run}
+    cpus = os.cpu_count() or 1
+    shards = shard(to_run, max(1, min(workers or cpus, cpus)), durations)
+    outputs: List[tuple[int, str]] = []
+    codes: List[int] = []
+    with tempfile.TemporaryDirectory(prefix="luna-tests-") as tmp:
+
+        async def run_shard(i: int, shard_files: List[str]) -> tuple[int, str, Dict[str, Any]]:
+            report = os.path.join(tmp, f"shard-{i}.xml")
+            # --rootdir: report paths must be relative to `root` even when the
+            # pytest config lives in a parent directory
+            cmd = [
+                sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider",
+                f"--rootdir={root}", f"--junitxml={report}", "-o", "junit_family=xunit1",
+                *shard_files,
+            ]
+            code, output = await _run(cmd, cwd=root)
+            return code, output, parse_junit(report)
+
+        results = await asyncio.gather(*(run_shard(i, s) for i, s in enumerate(shards)))
+
+    for shard_files, (code, output, per_file) in zip(shards, results):
+        codes.append(code)
+        outputs.append((code, output))
+        for t in shard_files:
+            reported = per_file.get(os.path.normpath(t))
+            res = reported or {
+                "passed": 0, "failed": 0, "errors": 0, "skipped": 0, "duration": 0.0, "failures": []
+            }
+            files[t] = res
+            # Only trust per-file results from shards that ran to completion, and
+            # never cache a file the report has no test cases for
+            ok = (
+                reported is not None
+                and code in (0, 1, 5)
+                and not res["failed"]
+                and not res["errors"]
+            )
+            cache[t] = {"key": keys[t], "ok": ok, "duration": res["duration"], "result": res}
+    if shards:
+        await asyncio.to_thread(save_cache, root, cache)
+
+    totals = {
+        k: sum(f[k] for f in files.values()) for k in ("passed", "failed", "errors", "skipped")
+    }
+    failures = [name for f in files.values() for name in f["failures"]]
+    headline = (
+        f"{totals['passed']} passed, {totals['failed']} failed, {totals['errors']} errors, "
+        f"{totals['skipped']} skipped; {len(to_run)} files in {len(shards)} shards, "
+        f"{len(cached)} cached, {time.perf_counter() - started:.2f}s"
+    )
+    # Failing shards last so their output survives tail truncation
+    combined = "\n".join(out for _, out in sorted(outputs, key=lambda o: o[0] not in (0, 5)))
     return {
-        "exit_code": code,
-        "summary": output.splitlines()[-10:],
-        "truncated_output": output[-4000:],
+        "exit_code": _merge_exit_codes(codes, bool(cached)),
+        "summary": [headline, *failures[:9]],
+        "truncated_output": combined[-4000:],
+        "path": root,
+        "selected": len(tests),
+        "shards": len(shards),
+        "cached": cached,
+        "files": files,
     }
 
 
@@ -53,10 +195,11 @@ async def trigger_workflow(
     )
     headers = {"Authorization": f"Bearer {GITHUB_TOKEN}", "Accept": "application/vnd.github+json"}
     payload = {"ref": ref, "inputs": inputs}
-    async with httpx.AsyncClient(timeout=30) as client:
+    client = pooled_client("github", timeout=30)
+    with span("github"):
         r = await client.post(url, headers=headers, json=payload)
-        if r.status_code not in (204, 201):
-            raise RuntimeError(f"Workflow dispatch failed {r.status_code}: {r.text}")
+    if r.status_code not in (204, 201):
+        raise RuntimeError(f"Workflow dispatch failed {r.status_code}: {r.text}")
     return {"dispatched": True, "workflow": workflow_file, "ref": ref}
 
 
@@ -0,0 +1,230 @@
+"""Content-Encoding negotiation for JSON results and SSE streams.
+
+`CompressionMiddleware` picks the best encoding the client accepts (zstd, then
+br, then gzip; zstd/br only when `zstandard` / `brotli` are installed):
+
+  - complete bodies are compressed when at least `COMPRESS_MIN_BYTES`
+  - streamed bodies (SSE) use one compressor for the whole stream and flush it
+    after every message, so each event reaches the client immediately while
+    repeated JSON keys still compress against earlier events
+
+Bodies (or stream messages) of at least `COMPRESS_THREAD_MIN_BYTES` are
+compressed in a worker thread: multi-MB base64 results would otherwise add
+exactly the loop lag that admission control sheds public traffic on.
+
+Bytes before/after and the CPU time spent are kept per encoding in
+`COMPRESSION_STATS` (served by `/public/metrics`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+import zlib
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from tools.tracing import record_phase
+
+try:
+    import zstandard
+except ImportError:  # optional: pip install '.[compression]'
+    zstandard = None  # type: ignore[assignment]
+try:
+    import brotli
+except ImportError:  # optional: pip install '.[compression]'
+    brotli = None  # type: ignore[assignment]
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_THREAD_MIN_BYTES = int(os.getenv("COMPRESS_THREAD_MIN_BYTES", str(256 * 1024)))
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+COMPRESSION_STATS: Dict[str, Counter[str]] = defaultdict(Counter)
+
+
+class _Gzip:
+    def __init__(self) -> None:
+        self._c = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, flush: bool = True) -> bytes:
+        out = self._c.compress(data)
+        return out + self._c.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        return self._c.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self) -> None:
+        self._c = brotli.Compressor(quality=5)
+
+    def compress(self, data: bytes, flush: bool = True) -> bytes:
+        out = self._c.process(data)
+        return out + self._c.flush() if flush else out
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+class _Zstd:
+    def __init__(self) -> None:
+        self._c = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data: bytes, flush: bool = True) -> bytes:
+        out = self._c.compress(data)
+        return out + self._c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else out
+
+    def finish(self) -> bytes:
+        return self._c.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def available_encoders() -> Dict[str, type]:
+    """Supported encodings in server preference order."""
+    encoders: Dict[str, type] = {}
+    if zstandard is not None:
+        encoders["zstd"] = _Zstd
+    if brotli is not None:
+        encoders["br"] = _Brotli
+    encoders["gzip"] = _Gzip
+    return encoders
+
+
+def negotiate(accept_encoding: str, encoders: Dict[str, type]) -> str | None:
+    """Return the preferred encoding acceptable to the client, or None for identity."""
+    q: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        q[name.strip().lower()] = weight
+    ranked: List[Tuple[float, int, str]] = []
+    for rank, name in enumerate(encoders):
+        weight = q.get(name, q.get("*", 0.0))
+        if weight > 0:
+            ranked.append((-weight, rank, name))
+    return min(ranked)[2] if ranked else None
+
+
+def _compress(encoder: Any, data: bytes, final: bool) -> Tuple[bytes, float]:
+    """Compress `data` (finishing the stream if `final`); return payload and thread CPU seconds."""
+    c0 = time.thread_time()
+    if final:
+        payload = encoder.compress(data, flush=False) + encoder.finish()
+    else:
+        payload = encoder.compress(data)
+    return payload, time.thread_time() - c0
+
+
+def _record(encoding: str, raw: int, compressed: int, cpu_s: float, responses: int = 0) -> None:
+    stats = COMPRESSION_STATS[encoding]
+    stats["responses"] += responses
+    stats["bytes_in"] += raw
+    stats["bytes_out"] += compressed
+    stats["cpu_us"] += int(cpu_s * 1_000_000)
+
+
+def compression_snapshot() -> Dict[str, Dict[str, float | int]]:
+    out: Dict[str, Dict[str, float | int]] = {}
+    for encoding, stats in COMPRESSION_STATS.items():
+        entry: Dict[str, float | int] = {k: v for k, v in stats.items() if k != "cpu_us"}
+        entry["cpu_ms"] = round(stats["cpu_us"] / 1000.0, 2)
+        if stats["bytes_in"]:
+            entry["ratio"] = round(stats["bytes_out"] / stats["bytes_in"], 3)
+        out[encoding] = entry
+    return out
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses under the given path prefixes."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        prefixes: Tuple[str, ...] = ("/mcp", "/public/"),
+        minimum_size: int | None = None,
+        thread_min_size: int | None = None,
+    ) -> None:
+        self.app = app
+        self.prefixes = prefixes
+        self.minimum_size = COMPRESS_MIN_BYTES if minimum_size is None else minimum_size
+        self.thread_min_size = (
+            COMPRESS_THREAD_MIN_BYTES if thread_min_size is None else thread_min_size
+        )
+        self.encoders = available_encoders()
+
+    async def _run(self, encoder: Any, data: bytes, final: bool) -> Tuple[bytes, float]:
+        if len(data) >= self.thread_min_size:
+            # one message at a time per response, so the encoder is never shared
+            return await asyncio.to_thread(_compress, encoder, data, final)
+        return _compress(encoder, data, final)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefixes):
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.encoders)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message = {}
+        encoder: Any = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal encoder, passthrough
+            if message["type"] == "http.response.start":
+                start.update(message)  # held until we know how to encode
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if passthrough:
+                await send(message)
+                return
+            if encoder is None:
+                headers = MutableHeaders(scope=start)
+                ctype = headers.get("content-type", "")
+                eligible = (
+                    "content-encoding" not in headers
+                    and ctype.startswith(COMPRESSIBLE_TYPES)
+                    and (more or len(body) >= self.minimum_size)
+                )
+                if ctype.startswith(COMPRESSIBLE_TYPES):
+                    headers.add_vary_header("Accept-Encoding")
+                if not eligible:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = self.encoders[encoding]()
+                headers["Content-Encoding"] = encoding
+                if not more:
+                    t0 = time.perf_counter()
+                    payload, cpu_s = await self._run(encoder, body, final=True)
+                    _record(encoding, len(body), len(payload), cpu_s, 1)
+                    record_phase("compress", t0)
+                    headers["Content-Length"] = str(len(payload))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": payload})
+                    return
+                del headers["Content-Length"]
+                COMPRESSION_STATS[encoding]["responses"] += 1
+                await send(start)
+            # Streaming: flush per message so every event is decodable on arrival
+            payload, cpu_s = await self._run(encoder, body, final=not more)
+            _record(encoding, len(body), len(payload), cpu_s)
+            await send({"type": "http.response.body", "body": payload, "more_body": more})
+
+        await self.app(scope, receive, send_compressed)
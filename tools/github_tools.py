@@ -6,6 +6,8 @@ from typing import Dict, Any, List
 
 from github import Github, GithubException
 
+from tools.tracing import span
+
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN", "")
 
 _client: Github | None = None
@@ -21,18 +23,24 @@ def _client_lazy() -> Github:
     return _client
 
 
+async def warm_up() -> None:
+    """Build the PyGithub client and open its HTTPS connection (rate_limit is free)."""
+    await asyncio.to_thread(lambda: _client_lazy().get_rate_limit())
+
+
 async def _run_cmd(cmd: List[str], cwd: str | None = None, timeout: int = 600) -> str:
-    proc = await asyncio.create_subprocess_exec(
-        *cmd,
-        cwd=cwd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.STDOUT,
-    )
-    try:
-        out, _ = await asyncio.wait_for(proc.communicate(), timeout)
-    except asyncio.TimeoutError:
-        proc.kill()
-        raise RuntimeError(f"Command timed out: {' '.join(cmd)}")
+    with span("subprocess"):
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            cwd=cwd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        try:
+            out, _ = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            raise RuntimeError(f"Command timed out: {' '.join(cmd)}")
     if proc.returncode != 0:
         raise RuntimeError(f"Command failed ({proc.returncode}): {out.decode(errors='replace')}")
     return out.decode(errors="replace")
@@ -52,12 +60,13 @@ async def clone_repo(url: str) -> str:
 
 async def create_branch(owner: str, repo: str, base: str, new_branch: str) -> Dict[str, Any]:
     gh = _client_lazy()
-    r = gh.get_repo(f"{owner}/{repo}")
-    base_ref = r.get_git_ref(f"heads/{base}")
-    try:
-        r.create_git_ref(ref=f"refs/heads/{new_branch}", sha=base_ref.object.sha)
-    except GithubException as e:
-        raise RuntimeError(f"create_branch failed: {e.data}") from e
+    with span("github"):
+        r = gh.get_repo(f"{owner}/{repo}")
+        base_ref = r.get_git_ref(f"heads/{base}")
+        try:
+            r.create_git_ref(ref=f"refs/heads/{new_branch}", sha=base_ref.object.sha)
+        except GithubException as e:
+            raise RuntimeError(f"create_branch failed: {e.data}") from e
     return {"branch": new_branch}
 
 
@@ -65,18 +74,19 @@ async def commit_file(
     owner: str, repo: str, branch: str, path: str, content_b64: str, message: str
 ) -> Dict[str, Any]:
     gh = _client_lazy()
-    r = gh.get_repo(f"{owner}/{repo}")
     try:
         decoded = base64.b64decode(content_b64).decode("utf-8")
     except Exception as e:  # noqa
         raise RuntimeError("Invalid base64 content") from e
-    try:
-        existing = r.get_contents(path, ref=branch)
-        r.update_file(path, message, decoded, existing.sha, branch=branch)
-        status = "updated"
-    except GithubException:
-        r.create_file(path, message, decoded, branch=branch)
-        status = "created"
+    with span("github"):
+        r = gh.get_repo(f"{owner}/{repo}")
+        try:
+            existing = r.get_contents(path, ref=branch)
+            r.update_file(path, message, decoded, existing.sha, branch=branch)
+            status = "updated"
+        except GithubException:
+            r.create_file(path, message, decoded, branch=branch)
+            status = "created"
     return {"status": status, "path": path, "branch": branch}
 
 
@@ -84,25 +94,27 @@ async def open_pr(
     owner: str, repo: str, head: str, base: str, title: str, body: str
 ) -> Dict[str, Any]:
     gh = _client_lazy()
-    r = gh.get_repo(f"{owner}/{repo}")
-    pr = r.create_pull(title=title, body=body, head=head, base=base)
+    with span("github"):
+        r = gh.get_repo(f"{owner}/{repo}")
+        pr = r.create_pull(title=title, body=body, head=head, base=base)
     return {"number": pr.number, "url": pr.html_url, "title": pr.title}
 
 
 async def list_issues(owner: str, repo: str, limit: int) -> Dict[str, Any]:
     gh = _client_lazy()
-    r = gh.get_repo(f"{owner}/{repo}")
-    issues = r.get_issues(state="open")
     out = []
-    for idx, issue in enumerate(issues):
-        if idx >= limit:
-            break
-        out.append(
-            {
-                "number": issue.number,
-                "title": issue.title,
-                "url": issue.html_url,
-                "labels": [label.name for label in issue.get_labels()],
-            }
-        )
+    with span("github"):
+        r = gh.get_repo(f"{owner}/{repo}")
+        issues = r.get_issues(state="open")
+        for idx, issue in enumerate(issues):
+            if idx >= limit:
+                break
+            out.append(
+                {
+                    "number": issue.number,
+                    "title": issue.title,
+                    "url": issue.html_url,
+                    "labels": [label.name for label in issue.get_labels()],
+                }
+            )
     return {"issues": out}
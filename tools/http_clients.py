@@ -0,0 +1,33 @@
+"""Pooled httpx clients shared across requests.
+
+One client per (name, event loop): connections (and their DNS/TLS setup) are
+reused between calls, and a loop that gets replaced (tests, serverless
+re-entry) simply gets a fresh client instead of one bound to a dead loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict, Tuple
+
+import httpx
+
+_clients: Dict[str, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+
+
+def pooled_client(name: str, **kwargs: Any) -> httpx.AsyncClient:
+    """Return the shared client `name`; `kwargs` apply only when it is created."""
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(name)
+    if entry is None or entry[0] is not loop:
+        kwargs.setdefault("limits", httpx.Limits(max_connections=100, max_keepalive_connections=20))
+        entry = _clients[name] = (loop, httpx.AsyncClient(**kwargs))
+    return entry[1]
+
+
+async def aclose_all() -> None:
+    loop = asyncio.get_running_loop()
+    for name, (owner, client) in list(_clients.items()):
+        if owner is loop:
+            await client.aclose()
+            del _clients[name]
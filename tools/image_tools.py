@@ -1,21 +1,132 @@
 # moved from subdirectory
 import io
+import os
 import base64
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Dict, List
+
 import httpx
 from PIL import Image
 
+MAX_BATCH = 200
+
+_pool: ProcessPoolExecutor | None = None
+
 
 def _to_b64(png_bytes: bytes) -> str:
     return base64.b64encode(png_bytes).decode("ascii")
 
 
+def _bw_png(raw: bytes) -> bytes:
+    """Decode, grayscale and PNG-encode (top level so worker processes can run it)."""
+    with Image.open(io.BytesIO(raw)) as img:
+        gray = img.convert("L")
+        buf = io.BytesIO()
+        gray.save(buf, format="PNG", optimize=True)
+        return buf.getvalue()
+
+
+def _transform_pool() -> ProcessPoolExecutor:
+    # spawn: forking a process that runs an event loop + threads is unsafe
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def _replace_broken_pool(broken: ProcessPoolExecutor) -> None:
+    # Every in-flight item sees the same breakage: only the first one drops the
+    # pool, so a replacement already built by another item is never orphaned.
+    global _pool
+    if _pool is broken:
+        _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _prime_pillow() -> None:
+    Image.init()  # registers every format plugin up front
+    buf = io.BytesIO()
+    Image.new("RGB", (2, 2)).save(buf, format="PNG")
+    _bw_png(buf.getvalue())
+
+
+async def warm_up(transform_pool: bool = False) -> None:
+    """Load Pillow plugins/codecs; optionally spawn the batch transform workers."""
+    await asyncio.to_thread(_prime_pillow)
+    if transform_pool:
+        loop = asyncio.get_running_loop()
+        buf = io.BytesIO()
+        Image.new("RGB", (2, 2)).save(buf, format="PNG")
+        png, pool = buf.getvalue(), _transform_pool()
+        await asyncio.gather(
+            *(loop.run_in_executor(pool, _bw_png, png) for _ in range(os.cpu_count() or 1))
+        )
+
+
 async def fetch_and_bw(image_url: str, timeout: int = 20) -> str:
     async with httpx.AsyncClient(timeout=timeout) as client:
         r = await client.get(image_url)
         r.raise_for_status()
         raw = r.content
-    with Image.open(io.BytesIO(raw)) as img:
-        gray = img.convert("L")
-        buf = io.BytesIO()
-        gray.save(buf, format="PNG", optimize=True)
-        return _to_b64(buf.getvalue())
+    return _to_b64(_bw_png(raw))
+
+
+async def bw_batch(
+    image_urls: List[str],
+    fetch_concurrency: int = 16,
+    transform_concurrency: int | None = None,
+    timeout: int = 20,
+    client: httpx.AsyncClient | None = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Fetch + grayscale many images, yielding per-item results as they complete.
+
+    Downloads overlap (at most `fetch_concurrency`), transforms run in a process
+    pool (at most `transform_concurrency`, default one per core), and a shared
+    in-flight bound keeps fetched-but-unprocessed images from piling up in
+    memory. A failing item yields ``{"ok": False, "error": ...}`` and does not
+    affect the others.
+    """
+    if len(image_urls) > MAX_BATCH:
+        raise ValueError(f"at most {MAX_BATCH} images per batch")
+    cpu = transform_concurrency or os.cpu_count() or 1
+    fetch_sem = asyncio.Semaphore(fetch_concurrency)
+    cpu_sem = asyncio.Semaphore(cpu)
+    inflight = asyncio.Semaphore(fetch_concurrency + cpu)
+    loop = asyncio.get_running_loop()
+    own_client = client is None
+    if client is None:
+        limits = httpx.Limits(max_connections=fetch_concurrency)
+        client = httpx.AsyncClient(timeout=timeout, limits=limits, follow_redirects=True)
+
+    async def one(index: int, url: str) -> Dict[str, Any]:
+        try:
+            async with inflight:
+                async with fetch_sem:
+                    r = await client.get(url)
+                    r.raise_for_status()
+                    raw = r.content
+                async with cpu_sem:
+                    pool = _transform_pool()
+                    try:
+                        png = await loop.run_in_executor(pool, _bw_png, raw)
+                    except BrokenProcessPool:
+                        _replace_broken_pool(pool)  # recreated for the next item
+                        raise
+            return {"index": index, "url": url, "ok": True, "image_b64": _to_b64(png)}
+        except Exception as e:  # noqa: BLE001
+            return {"index": index, "url": url, "ok": False, "error": str(e)[:200]}
+
+    tasks = [asyncio.create_task(one(i, url)) for i, url in enumerate(image_urls)]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        for t in tasks:
+            t.cancel()
+        if own_client:
+            await client.aclose()
@@ -0,0 +1,138 @@
+"""On-demand sampling profiler for a live worker.
+
+A daemon thread snapshots interpreter stacks via `sys._current_frames()` at a
+fixed interval and counts them in collapsed form
+(``file:func;file:func <count>``, root first), which flamegraph.pl /
+speedscope read directly. While it runs, the event loop is probed for lag and
+the pending asyncio tasks are snapshotted at the end.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Any, Dict, List
+
+MAX_SECONDS = 60.0
+MAX_STACK_DEPTH = 64
+
+
+def _collapse(frame: FrameType | None) -> str:
+    parts: List[str] = []
+    while frame is not None and len(parts) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class StackSampler:
+    """Background thread counting collapsed stacks of the watched threads."""
+
+    def __init__(self, interval: float, thread_ids: set[int] | None = None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.counts: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="luna-profiler", daemon=True)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == own or (self.thread_ids is not None and tid not in self.thread_ids):
+                    continue
+                self.counts[_collapse(frame)] += 1
+            self.samples += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {n}" for stack, n in self.counts.most_common())
+
+
+async def measure_loop_lag(seconds: float, probe: float = 0.05) -> List[float]:
+    """Sleep-probe the running loop for `seconds`; return per-probe lag in ms."""
+    lags: List[float] = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        await asyncio.sleep(probe)
+        lags.append(max(0.0, (time.perf_counter() - t0 - probe) * 1000.0))
+    return lags
+
+
+def task_snapshot(limit: int = 200) -> List[Dict[str, Any]]:
+    """Describe current asyncio tasks: name, coroutine, state and await point."""
+    out: List[Dict[str, Any]] = []
+    for task in list(asyncio.all_tasks())[:limit]:
+        coro = task.get_coro()
+        stack = task.get_stack(limit=1)
+        where = None
+        if stack:
+            f = stack[0]
+            where = f"{os.path.basename(f.f_code.co_filename)}:{f.f_code.co_name}:{f.f_lineno}"
+        if task.cancelled():
+            state = "cancelled"
+        elif task.done():
+            state = "done"
+        else:
+            state = "pending"
+        out.append(
+            {
+                "name": task.get_name(),
+                "coro": getattr(coro, "__qualname__", repr(coro)),
+                "state": state,
+                "waiting_at": where,
+            }
+        )
+    return out
+
+
+def _lag_summary(lags: List[float]) -> Dict[str, float | int]:
+    if not lags:
+        return {"probes": 0}
+    arr = sorted(lags)
+    return {
+        "probes": len(arr),
+        "avg_ms": round(sum(arr) / len(arr), 2),
+        "p99_ms": round(arr[min(len(arr) - 1, int(0.99 * len(arr)))], 2),
+        "max_ms": round(arr[-1], 2),
+    }
+
+
+async def profile(
+    seconds: float, interval_ms: float = 10.0, all_threads: bool = False
+) -> Dict[str, Any]:
+    """Sample the worker for `seconds` without blocking the event loop.
+
+    Only the loop thread is sampled unless `all_threads` is set (useful when
+    work is pushed to the default executor).
+    """
+    seconds = min(max(seconds, 0.05), MAX_SECONDS)
+    watched = None if all_threads else {threading.get_ident()}
+    sampler = StackSampler(max(interval_ms, 1.0) / 1000.0, watched)
+    sampler.start()
+    try:
+        lags = await measure_loop_lag(seconds)
+    finally:
+        sampler.stop()
+    return {
+        "seconds": seconds,
+        "interval_ms": sampler.interval * 1000.0,
+        "samples": sampler.samples,
+        "collapsed": sampler.collapsed(),
+        "loop_lag": _lag_summary(lags),
+        "tasks": task_snapshot(),
+    }
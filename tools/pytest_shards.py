@@ -0,0 +1,201 @@
+"""Planning helpers for sharded, incremental pytest runs (used by `run_pytest`).
+
+- discovery of test files under a target directory
+- per-file cache keys: a hash over the test file, the local modules it imports
+  (transitively, resolved statically via `ast`), enclosing `conftest.py` files
+  and the root pytest config. Dynamic imports are not seen.
+- "changed since ref" selection from `git diff`
+- longest-first sharding by previously observed durations
+- merging JUnit XML reports back into per-file results
+"""
+
+from __future__ import annotations
+
+import ast
+import hashlib
+import json
+import os
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterable, List, Set
+
+SKIP_DIRS = {".git", ".hg", ".venv", "venv", "node_modules", "__pycache__", ".tox", ".mypy_cache"}
+CONFIG_FILES = ("pytest.ini", "pyproject.toml", "setup.cfg", "tox.ini")
+CACHE_FILE = os.path.join(".pytest_cache", "luna_run_tests.json")
+
+
+def discover_test_files(root: str) -> List[str]:
+    """Return test files (`test_*.py` / `*_test.py`) relative to `root`, sorted.
+
+    Name based only: pytest `testpaths` / `python_files` / `norecursedirs` of the
+    target are not consulted, so this can include modules plain `pytest` skips.
+    """
+    out: List[str] = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith(".")]
+        for name in filenames:
+            if name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py")):
+                out.append(os.path.relpath(os.path.join(dirpath, name), root))
+    return sorted(out)
+
+
+class DependencyIndex:
+    """Resolve and hash the local sources a test file depends on."""
+
+    def __init__(self, root: str):
+        self.root = root
+        src = os.path.join(root, "src")
+        self.bases = [root, src] if os.path.isdir(src) else [root]
+        self._imports: Dict[str, Set[str]] = {}
+        self._hashes: Dict[str, str] = {}
+
+    def file_hash(self, rel: str) -> str:
+        if rel not in self._hashes:
+            with open(os.path.join(self.root, rel), "rb") as f:
+                self._hashes[rel] = hashlib.sha256(f.read()).hexdigest()
+        return self._hashes[rel]
+
+    def _module_files(self, dotted: str) -> List[str]:
+        """Files executed by importing `dotted`: package `__init__`s plus the module.
+
+        Returns [] unless the whole name resolves locally (namespace package
+        directories resolve without contributing a file).
+        """
+        parts = dotted.split(".")
+        for base in self.bases:
+            found: List[str] = []
+            for i in range(1, len(parts) + 1):
+                stem = os.path.join(base, *parts[:i])
+                init = os.path.join(stem, "__init__.py")
+                if os.path.isfile(init):
+                    found.append(init)
+                elif i == len(parts) and os.path.isfile(stem + ".py"):
+                    found.append(stem + ".py")
+                elif not os.path.isdir(stem):
+                    break
+            else:
+                return [os.path.relpath(p, self.root) for p in found]
+        return []
+
+    def _direct_imports(self, rel: str) -> Set[str]:
+        if rel in self._imports:
+            return self._imports[rel]
+        deps: Set[str] = set()
+        try:
+            with open(os.path.join(self.root, rel), "rb") as f:
+                tree = ast.parse(f.read(), filename=rel)
+        except (SyntaxError, ValueError, OSError):
+            tree = None
+        pkg_parts = os.path.dirname(rel).split(os.sep) if os.path.dirname(rel) else []
+        for node in ast.walk(tree) if tree is not None else ():
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    deps.update(self._module_files(alias.name))
+            elif isinstance(node, ast.ImportFrom):
+                if node.level:
+                    keep = len(pkg_parts) - (node.level - 1)
+                    if keep < 0:
+                        continue
+                    prefix = pkg_parts[:keep]
+                    base = ".".join(prefix + ([node.module] if node.module else []))
+                else:
+                    base = node.module or ""
+                for alias in node.names:
+                    if base:
+                        # `from pkg import name`: name is a submodule or an attribute of pkg
+                        deps.update(
+                            self._module_files(f"{base}.{alias.name}") or self._module_files(base)
+                        )
+                    else:
+                        deps.update(self._module_files(alias.name))
+        deps.discard(rel)
+        self._imports[rel] = deps
+        return deps
+
+    def sources(self, test_rel: str) -> Set[str]:
+        """Transitive local sources of a test file, its conftests and root config."""
+        seen: Set[str] = set()
+        stack = [test_rel]
+        d = os.path.dirname(test_rel)
+        while True:
+            conftest = os.path.join(d, "conftest.py")
+            if os.path.isfile(os.path.join(self.root, conftest)):
+                stack.append(os.path.normpath(conftest))
+            if not d:
+                break
+            d = os.path.dirname(d)
+        while stack:
+            rel = stack.pop()
+            if rel in seen:
+                continue
+            seen.add(rel)
+            stack.extend(self._direct_imports(rel) - seen)
+        seen.update(c for c in CONFIG_FILES if os.path.isfile(os.path.join(self.root, c)))
+        return seen
+
+    def cache_key(self, test_rel: str) -> str:
+        h = hashlib.sha256()
+        for rel in sorted(self.sources(test_rel)):
+            h.update(rel.encode() + b"\0" + self.file_hash(rel).encode() + b"\n")
+        return h.hexdigest()
+
+
+def select_changed(index: DependencyIndex, tests: Iterable[str], changed: Set[str]) -> List[str]:
+    return [t for t in tests if index.sources(t) & changed]
+
+
+def shard(tests: List[str], n: int, durations: Dict[str, float]) -> List[List[str]]:
+    """Greedy longest-first assignment; unknown durations count as 1s."""
+    shards: List[List[str]] = [[] for _ in range(max(1, min(n, len(tests))))]
+    loads = [0.0] * len(shards)
+    for t in sorted(tests, key=lambda t: durations.get(t, 1.0), reverse=True):
+        i = loads.index(min(loads))
+        shards[i].append(t)
+        loads[i] += durations.get(t, 1.0)
+    return [s for s in shards if s]
+
+
+def parse_junit(path: str) -> Dict[str, Dict[str, Any]]:
+    """Per-file counts from a JUnit XML report written with ``junit_family=xunit1``."""
+    out: Dict[str, Dict[str, Any]] = {}
+    try:
+        tree = ET.parse(path)
+    except (ET.ParseError, OSError):
+        return out
+    for case in tree.iter("testcase"):
+        rel = case.get("file")
+        if not rel:
+            rel = case.get("classname", "").replace(".", os.sep) + ".py"
+        rel = os.path.normpath(rel)
+        entry = out.setdefault(
+            rel,
+            {"passed": 0, "failed": 0, "errors": 0, "skipped": 0, "duration": 0.0, "failures": []},
+        )
+        entry["duration"] += float(case.get("time") or 0.0)
+        if case.find("failure") is not None:
+            entry["failed"] += 1
+            entry["failures"].append(f"{rel}::{case.get('name')}")
+        elif case.find("error") is not None:
+            entry["errors"] += 1
+            entry["failures"].append(f"{rel}::{case.get('name')}")
+        elif case.find("skipped") is not None:
+            entry["skipped"] += 1
+        else:
+            entry["passed"] += 1
+    return out
+
+
+def load_cache(root: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(root, CACHE_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(root: str, cache: Dict[str, Any]) -> None:
+    path = os.path.join(root, CACHE_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(tmp, path)
@@ -0,0 +1,125 @@
+"""JSON Schema + parameter validator compiled from a tool's signature.
+
+Compiled once when a tool is registered, so dispatch only runs a few
+`isinstance` checks and never has to guess from a `TypeError` whether the
+caller or the tool was at fault.
+"""
+
+from __future__ import annotations
+
+import inspect
+import json
+import types
+import typing
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple
+
+Check = Callable[[Any], bool]
+
+_SCALARS: Dict[Any, Tuple[Dict[str, Any], Check]] = {
+    str: ({"type": "string"}, lambda v: isinstance(v, str)),
+    # bool is an int subclass; JSON true is not a valid integer
+    int: ({"type": "integer"}, lambda v: isinstance(v, int) and not isinstance(v, bool)),
+    float: ({"type": "number"}, lambda v: isinstance(v, (int, float)) and not isinstance(v, bool)),
+    bool: ({"type": "boolean"}, lambda v: isinstance(v, bool)),
+    type(None): ({"type": "null"}, lambda v: v is None),
+}
+
+
+def _any(_: Any) -> bool:
+    return True
+
+
+def _compile_type(tp: Any) -> Tuple[Dict[str, Any], Check]:
+    if tp in _SCALARS:
+        return _SCALARS[tp]
+    origin = typing.get_origin(tp)
+    args = typing.get_args(tp)
+    if origin in (typing.Union, types.UnionType):
+        compiled = [_compile_type(a) for a in args]
+        checks = [c for _, c in compiled]
+        return {"anyOf": [s for s, _ in compiled]}, lambda v: any(c(v) for c in checks)
+    if tp is dict or origin is dict:
+        schema: Dict[str, Any] = {"type": "object"}
+        if len(args) == 2:
+            value_schema, value_check = _compile_type(args[1])
+            if value_schema:
+                schema["additionalProperties"] = value_schema
+            return schema, lambda v: isinstance(v, dict) and all(value_check(x) for x in v.values())
+        return schema, lambda v: isinstance(v, dict)
+    if tp is list or origin is list:
+        if args:
+            item_schema, item_check = _compile_type(args[0])
+            schema = {"type": "array", "items": item_schema}
+            return schema, lambda v: isinstance(v, list) and all(item_check(x) for x in v)
+        return {"type": "array"}, lambda v: isinstance(v, list)
+    return {}, _any  # Any / unannotated: accept anything
+
+
+@dataclass
+class ToolSchema:
+    name: str
+    description: str
+    input_schema: Dict[str, Any]
+    _checks: Dict[str, Check]
+    _expected: Dict[str, str]
+    _required: Tuple[str, ...]
+    _accepts_extra: bool
+
+    def errors(self, params: Dict[str, Any]) -> List[str]:
+        """Return human-readable problems with `params` ([] when valid)."""
+        problems = [f"missing required parameter '{p}'" for p in self._required if p not in params]
+        for key, value in params.items():
+            check = self._checks.get(key)
+            if check is None:
+                if not self._accepts_extra:
+                    problems.append(f"unexpected parameter '{key}'")
+            elif not check(value):
+                problems.append(f"parameter '{key}' must match {self._expected[key]}")
+        return problems
+
+    def describe(self) -> Dict[str, Any]:
+        """MCP `tools/list` entry."""
+        return {
+            "name": self.name,
+            "description": self.description,
+            "inputSchema": self.input_schema,
+        }
+
+
+def compile_tool_schema(fn: Callable[..., Any], name: str, description: str) -> ToolSchema:
+    hints = typing.get_type_hints(fn)
+    properties: Dict[str, Any] = {}
+    checks: Dict[str, Check] = {}
+    expected: Dict[str, str] = {}
+    required: List[str] = []
+    accepts_extra = False
+    for param in inspect.signature(fn).parameters.values():
+        if param.kind is param.VAR_KEYWORD:
+            accepts_extra = True
+            continue
+        if param.kind is param.VAR_POSITIONAL:
+            continue
+        schema, check = _compile_type(hints.get(param.name, Any))
+        schema = dict(schema)
+        expected[param.name] = json.dumps(schema) if schema else "any value"
+        if param.default is param.empty:
+            required.append(param.name)
+        else:
+            try:
+                json.dumps(param.default)
+                schema["default"] = param.default
+            except TypeError:
+                pass
+        properties[param.name] = schema
+        checks[param.name] = check
+    input_schema: Dict[str, Any] = {
+        "type": "object",
+        "properties": properties,
+        "additionalProperties": accepts_extra,
+    }
+    if required:
+        input_schema["required"] = required
+    return ToolSchema(
+        name, description, input_schema, checks, expected, tuple(required), accepts_extra
+    )
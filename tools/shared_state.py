@@ -0,0 +1,280 @@
+"""Host-wide state shared by all workers: latency metrics and a result cache.
+
+Enabled by pointing `SHARED_STATE_DIR` at a directory every worker (and
+replica on the same host) can reach; without it each worker keeps its own
+in-process metrics and nothing is cached.
+
+Metrics live in an mmap-backed file split into per-worker regions. A worker
+claims a free region by taking a POSIX record lock on it for its lifetime (the
+kernel drops the lock if the worker dies), then is the only writer of that
+region, so updates need no locking. Scrapes merge every region. Counters are
+cumulative for the life of the file (delete it to reset, e.g. on deploy). If
+the file cannot be opened or used (unwritable directory, layout left by an
+older build) the worker logs once and falls back to in-process metrics.
+
+Results are cached in SQLite (WAL mode, so readers never block the writer)
+with a TTL, letting workers reuse each other's `code_gen` / image output.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+from typing import Any, Dict
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None  # type: ignore[assignment]
+
+SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR", "")
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "3600"))
+
+log = logging.getLogger(__name__)
+
+# -------------------- mmap metrics -------------------- #
+_MAGIC = b"LUNAMET1"
+_HEADER = struct.Struct("<8sII")  # magic, regions, slots per region
+_NAME_LEN = 48
+_BUCKETS = 40
+_BUCKET_BASE_MS = 0.1  # bucket i covers values up to 0.1ms * sqrt(2)**i (~74s at i=39)
+_SLOT = struct.Struct(f"<{_NAME_LEN}sQdd{_BUCKETS}Q")  # name, count, sum_ms, max_ms, buckets
+_REGION_HEAD = struct.Struct("<Q")  # owner pid (informational)
+
+
+def _bucket(value_ms: float) -> int:
+    if value_ms <= _BUCKET_BASE_MS:
+        return 0
+    return min(_BUCKETS - 1, math.ceil(2 * math.log2(value_ms / _BUCKET_BASE_MS)))
+
+
+def _bucket_upper(i: int) -> float:
+    return _BUCKET_BASE_MS * (2 ** (i / 2))
+
+
+class SharedMetrics:
+    """Latency histograms in a shared mmap file, one single-writer region per worker."""
+
+    def __init__(self, path: str, regions: int = 16, slots: int = 64):
+        self.path = path
+        self.regions = regions
+        self.slots = slots
+        self.region_size = _REGION_HEAD.size + slots * _SLOT.size
+        size = _HEADER.size + regions * self.region_size
+        # Opened once per process: closing any other fd of this file would drop our lock.
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, _HEADER.size, 0)
+        try:
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+            self._mm = mmap.mmap(self._fd, size)
+            magic, r, s = _HEADER.unpack_from(self._mm, 0)
+            if magic != _MAGIC:
+                _HEADER.pack_into(self._mm, 0, _MAGIC, regions, slots)
+            elif (r, s) != (regions, slots):
+                raise ValueError(f"{path} has layout {r}x{s}, expected {regions}x{slots}")
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, _HEADER.size, 0)
+        self._pid = 0
+        self._region: int | None = None
+        self._slot_index: Dict[str, int] = {}
+
+    def _offset(self, region: int, slot: int | None = None) -> int:
+        base = _HEADER.size + region * self.region_size
+        if slot is None:
+            return base
+        return base + _REGION_HEAD.size + slot * _SLOT.size
+
+    def _claim(self) -> int | None:
+        # Re-claim after fork: record locks are not inherited by children.
+        if self._pid == os.getpid():
+            return self._region
+        self._pid, self._region, self._slot_index = os.getpid(), None, {}
+        for region in range(self.regions):
+            start = self._offset(region)
+            try:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, self.region_size, start)
+            except OSError:
+                continue
+            _REGION_HEAD.pack_into(self._mm, start, self._pid)
+            # A reclaimed region keeps its counters; index the names it already holds.
+            for slot in range(self.slots):
+                off = self._offset(region, slot)
+                name = self._mm[off : off + _NAME_LEN].rstrip(b"\0")
+                if name:
+                    self._slot_index[name.decode()] = slot
+            self._region = region
+            break
+        return self._region
+
+    def observe(self, name: str, value_ms: float) -> None:
+        region = self._claim()
+        if region is None:
+            return  # more workers than regions; drop rather than contend
+        slot = self._slot_index.get(name)
+        if slot is None:
+            if len(self._slot_index) >= self.slots:
+                return
+            slot = len(self._slot_index)
+            self._slot_index[name] = slot
+            self._mm[self._offset(region, slot) : self._offset(region, slot) + _NAME_LEN] = (
+                name.encode()[:_NAME_LEN].ljust(_NAME_LEN, b"\0")
+            )
+        off = self._offset(region, slot)
+        raw_name, count, total, peak, *buckets = _SLOT.unpack_from(self._mm, off)
+        buckets[_bucket(value_ms)] += 1
+        _SLOT.pack_into(
+            self._mm, off, raw_name, count + 1, total + value_ms, max(peak, value_ms), *buckets
+        )
+
+    def snapshot(self) -> Dict[str, Dict[str, float | int]]:
+        """Merge all regions: name -> count, avg_ms, p95_ms (bucket bound), max_ms."""
+        merged: Dict[str, list] = {}
+        for region in range(self.regions):
+            for slot in range(self.slots):
+                raw_name, count, total, peak, *buckets = _SLOT.unpack_from(
+                    self._mm, self._offset(region, slot)
+                )
+                name = raw_name.rstrip(b"\0").decode()
+                if not name or not count:
+                    continue
+                acc = merged.setdefault(name, [0, 0.0, 0.0, [0] * _BUCKETS])
+                acc[0] += count
+                acc[1] += total
+                acc[2] = max(acc[2], peak)
+                acc[3] = [a + b for a, b in zip(acc[3], buckets)]
+        out: Dict[str, Dict[str, float | int]] = {}
+        for name, (count, total, peak, buckets) in merged.items():
+            target, seen, p95 = 0.95 * count, 0, peak
+            for i, n in enumerate(buckets):
+                seen += n
+                if seen >= target:
+                    p95 = min(_bucket_upper(i), peak)
+                    break
+            out[name] = {
+                "count": count,
+                "avg_ms": round(total / count, 2),
+                "p95_ms": round(p95, 2),
+                "max_ms": round(peak, 2),
+            }
+        return out
+
+    def active_workers(self) -> int:
+        """Number of regions currently held by a live worker."""
+        live = 0
+        for region in range(self.regions):
+            start = self._offset(region)
+            if region == self._region and self._pid == os.getpid():
+                live += 1
+                continue
+            try:
+                fcntl.lockf(self._fd, fcntl.LOCK_SH | fcntl.LOCK_NB, self.region_size, start)
+            except OSError:
+                live += 1
+            else:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self.region_size, start)
+        return live
+
+
+# -------------------- SQLite result cache -------------------- #
+class SharedCache:
+    """JSON value cache with TTL in a WAL-mode SQLite file.
+
+    Calls run in a thread so disk I/O never stalls the event loop.
+    """
+
+    def __init__(self, path: str, ttl: float = CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+
+    def _get(self, key: str) -> Any:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM cache WHERE key = ? AND expires > ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl),
+            )
+            self._writes += 1
+            if self._writes % 256 == 0:
+                self._db.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+
+    async def get(self, key: str) -> Any:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        await asyncio.to_thread(self._set, key, value, self.ttl if ttl is None else ttl)
+
+
+_metrics: SharedMetrics | None = None
+_metrics_error: str | None = None
+_cache: SharedCache | None = None
+_init_lock = threading.Lock()
+
+
+def disable_shared_metrics(error: BaseException) -> None:
+    """Stop using host-wide metrics in this worker (callers fall back to per-worker)."""
+    global _metrics, _metrics_error
+    if _metrics_error is None:
+        log.warning("shared metrics disabled, using per-worker metrics: %s", error)
+    _metrics, _metrics_error = None, str(error)[:200]
+
+
+def shared_metrics_error() -> str | None:
+    return _metrics_error
+
+
+def get_shared_metrics() -> SharedMetrics | None:
+    global _metrics
+    if _metrics is None and SHARED_STATE_DIR and fcntl is not None and _metrics_error is None:
+        with _init_lock:
+            if _metrics is None and _metrics_error is None:
+                try:
+                    os.makedirs(SHARED_STATE_DIR, exist_ok=True)
+                    path = os.path.join(SHARED_STATE_DIR, "metrics.mmap")
+                    _metrics = SharedMetrics(path)
+                except Exception as e:  # noqa: BLE001
+                    disable_shared_metrics(e)
+    return _metrics
+
+
+def observe_shared(name: str, value_ms: float) -> None:
+    """Record into host-wide metrics if enabled; never raises into the request path."""
+    metrics = get_shared_metrics()
+    if metrics is None:
+        return
+    try:
+        metrics.observe(name, value_ms)
+    except Exception as e:  # noqa: BLE001
+        disable_shared_metrics(e)
+
+
+def get_shared_cache() -> SharedCache | None:
+    global _cache
+    if _cache is None and SHARED_STATE_DIR:
+        with _init_lock:
+            if _cache is None:
+                os.makedirs(SHARED_STATE_DIR, exist_ok=True)
+                _cache = SharedCache(os.path.join(SHARED_STATE_DIR, "cache.sqlite3"))
+    return _cache
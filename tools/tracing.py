@@ -0,0 +1,175 @@
+"""Lightweight request tracing with per-phase timing.
+
+A `Trace` is opened per HTTP request by `TracingMiddleware` and stored in a
+context variable; code along the dispatch path wraps interesting work in
+`span("phase")`. Phase durations are:
+
+  - aggregated per phase in `PHASE_HISTORY` and, when enabled, the host-wide
+    shared metrics segment (served by `/public/metrics`)
+  - returned to the caller in a `Server-Timing` response header
+  - optionally appended (sampled) as JSON lines to `TRACE_EXPORT_PATH`
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import random
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Tuple
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from tools.shared_state import observe_shared
+
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+
+PHASE_HISTORY: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=500))
+
+_CURRENT: ContextVar["Trace | None"] = ContextVar("luna_trace", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    start_ms: float
+    dur_ms: float
+
+
+@dataclass
+class Trace:
+    name: str
+    t0: float = field(default_factory=time.perf_counter)
+    spans: List[Span] = field(default_factory=list)
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    total_ms: float | None = None
+
+    def add(self, name: str, start: float, end: float) -> None:
+        self.spans.append(Span(name, (start - self.t0) * 1000.0, (end - start) * 1000.0))
+
+    def totals(self) -> Dict[str, float]:
+        """Summed duration per phase (a phase may occur several times)."""
+        out: Dict[str, float] = {}
+        for s in self.spans:
+            out[s.name] = out.get(s.name, 0.0) + s.dur_ms
+        return out
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.t0) * 1000.0
+
+    def server_timing(self) -> str:
+        parts = [f"{name};dur={dur:.2f}" for name, dur in self.totals().items()]
+        parts.append(f"total;dur={self.elapsed_ms():.2f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "ts": time.time(),
+            "total_ms": round(self.total_ms if self.total_ms is not None else self.elapsed_ms(), 3),
+            "attrs": self.attrs,
+            "spans": [
+                {"name": s.name, "start_ms": round(s.start_ms, 3), "dur_ms": round(s.dur_ms, 3)}
+                for s in self.spans
+            ],
+        }
+
+
+def current_trace() -> Trace | None:
+    return _CURRENT.get()
+
+
+def record_phase(name: str, start: float, end: float | None = None) -> None:
+    """Record a completed phase on the current trace and in the aggregate history."""
+    if end is None:
+        end = time.perf_counter()
+    dur_ms = (end - start) * 1000.0
+    PHASE_HISTORY[name].append(dur_ms)
+    observe_shared(f"phase:{name}", dur_ms)
+    trace = _CURRENT.get()
+    if trace is not None:
+        trace.add(name, start, end)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, t0)
+
+
+# httpcore step name -> phase name
+_UPSTREAM_STEPS = {
+    "connect_tcp": "upstream_connect",
+    "start_tls": "upstream_tls",
+    "send_request_headers": "upstream_send",
+    "send_request_body": "upstream_send",
+    "receive_response_headers": "upstream_ttfb",
+    "receive_response_body": "upstream_body",
+}
+
+
+def upstream_tracer() -> Callable[[str, Dict[str, Any]], Awaitable[None]]:
+    """Return an httpx ``trace`` extension splitting a request into phases.
+
+    Usage: ``client.post(url, extensions={"trace": upstream_tracer()})``.
+    Events arrive as ``<prefix>.<step>.started|complete|failed``.
+    """
+    starts: Dict[str, float] = {}
+
+    async def _hook(event: str, info: Dict[str, Any]) -> None:  # noqa: ARG001
+        prefix, _, stage = event.rpartition(".")
+        phase = _UPSTREAM_STEPS.get(prefix.rpartition(".")[2])
+        if phase is None:
+            return
+        if stage == "started":
+            starts[phase] = time.perf_counter()
+        elif phase in starts:
+            record_phase(phase, starts.pop(phase))
+
+    return _hook
+
+
+def _export(trace: Trace) -> None:
+    if not TRACE_EXPORT_PATH or random.random() >= TRACE_SAMPLE_RATE:
+        return
+    try:
+        with open(TRACE_EXPORT_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(trace.to_dict()) + "\n")
+    except OSError:
+        pass  # tracing must never break a request
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a `Trace` for matching request paths."""
+
+    def __init__(self, app: ASGIApp, prefixes: Tuple[str, ...] = ("/mcp", "/public/")) -> None:
+        self.app = app
+        self.prefixes = prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefixes):
+            await self.app(scope, receive, send)
+            return
+        trace = Trace(f"{scope['method']} {scope['path']}")
+        token = _CURRENT.set(trace)
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("Server-Timing", trace.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _CURRENT.reset(token)
+            trace.total_ms = trace.elapsed_ms()
+            _export(trace)
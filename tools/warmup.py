@@ -0,0 +1,62 @@
+"""Startup warm-up with readiness gating.
+
+`Warmup.run()` executes named async steps concurrently (preconnecting pooled
+upstream clients, priming lazy clients, Pillow, regexes, ...). The worker is
+ready once every step finished or `timeout` elapsed; a failing or slow step
+is recorded but never blocks readiness beyond the timeout.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+Step = Callable[[], Awaitable[Any]]
+
+
+class Warmup:
+    def __init__(self, steps: Dict[str, Step], timeout: float = 10.0):
+        self.steps = steps
+        self.timeout = timeout
+        self.state = "pending"  # pending | running | ready | timed_out
+        self.duration_ms: float | None = None
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.state in ("ready", "timed_out")
+
+    async def _step(self, name: str, fn: Step) -> None:
+        t0 = time.perf_counter()
+        try:
+            await fn()
+            self.results[name] = {"ok": True}
+        except Exception as e:  # noqa: BLE001
+            self.results[name] = {"ok": False, "error": str(e)[:200]}
+        self.results[name]["ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+
+    async def run(self) -> None:
+        self.state = "running"
+        t0 = time.perf_counter()
+        tasks = {
+            asyncio.create_task(self._step(name, fn), name=f"warmup:{name}"): name
+            for name, fn in self.steps.items()
+        }
+        pending: set = set()
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=self.timeout)
+        for task in pending:
+            task.cancel()
+            self.results[tasks[task]] = {"ok": False, "error": "timed_out"}
+        self.duration_ms = round((time.perf_counter() - t0) * 1000.0, 2)
+        self.state = "timed_out" if pending else "ready"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "duration_ms": self.duration_ms,
+            "timeout_s": self.timeout,
+            "steps": self.results,
+        }